@@ -1,60 +1,36 @@
-import sys
-import json
-import time
-import imageio
-import traceback
-from PyQt5 import QtWidgets, QtCore, QtGui
-from PyQt5.QtCore import QMutex
+from PyQt5 import QtWidgets, QtGui
 
 from utils import make_x_image, try_url
 from guis.basicGUI import basicGUI
-from guis.workers import WorkerSignals
-from PyQt5.QtCore import QRunnable, pyqtSlot
+from guis.workers import previewWorker
+from guis.previewDecoder import previewDecoder
+from guis.previewRegistry import get_preview_registry
+from guis.settings.settings import PREVIEW_TARGET_FPS
 
 
-class bigPiEyePreviewWorker(QRunnable):
+class bigPiEyePreviewWorker(previewWorker):
     """
     Worker for getting a preview of the actual image (full resolution)
     This can be used for checking the focus of the camera.
 
     This is implemented as a worker thread so all the previews can load seperately and do not wait for eachother.
+    It runs the previewWorker loop in paced mode with its own getPreview, so frames are delivered through self.mailbox.
     """
 
+    # size (width, height) the preview is displayed at
+    PREVIEW_SIZE = (4056 // 4, 3040 // 4)
+
     def __init__(self, camera_name):
-        super(bigPiEyePreviewWorker, self).__init__()
+        super(bigPiEyePreviewWorker, self).__init__(
+            self, target_fps=PREVIEW_TARGET_FPS["pieye_full"]
+        )
 
         self.camera_name = (
             camera_name  # name / address of the camera, ie 'pieye-dragonfly.local'
         )
-        self.signals = WorkerSignals()
-        self.still_running = True  # used to stop the worker when the window is closed
-        self.mutex = QMutex()
 
-    @pyqtSlot()
-    def run(self):
-        """
-        Initialise the runner function
-        """
-        while self.still_running:
-            time.sleep(0.05)
-            # Retrieve args/kwargs here; and fire processing using them
-            try:
-                result = self.getPreview()
-            except:
-                traceback.print_exc()
-                exctype, value = sys.exc_info()[:2]
-                self.signals.error.emit((exctype, value, traceback.format_exc()))
-            else:
-                self.signals.result.emit(result)  # Return the result of the processing
-
-    def close(self):
-        """close
-        Stop the worker when the preview window is closed
-        """
-        self.mutex.lock()
-        self.still_running = False  # ends the loops/worker above
-        self.mutex.unlock()
-        self.signals.finished.emit()
+        # decodes the previews at display size in this worker thread
+        self.decoder = previewDecoder(*self.PREVIEW_SIZE)
 
     def getPreview(self):
         """getPreview
@@ -62,7 +38,7 @@ class bigPiEyePreviewWorker(QRunnable):
         then request that image and display it
 
         Returns:
-            data: a numpy array of the image.
+            data: a QImage of the image, scaled to display size.
         """
         # Get full resolution preview
         url = f"http://{self.camera_name}:8080/full-preview"
@@ -72,8 +48,8 @@ class bigPiEyePreviewWorker(QRunnable):
         if response is None:
             return None
 
-        # If everything went well, return a numpy array of the image
-        data = imageio.imread(response.content)
+        # If everything went well, return the image decoded at display size
+        data = self.decoder.decode(response.content)
         return data
 
 
@@ -81,17 +57,21 @@ class bigPiEyePreviewGUI(basicGUI):
     """
     Opens a new window with a larger slower preview. This allows for dynamically adjusting the focus.
     Although the update is slow, as it asks the Pi-Eye to capture a full-resolution image each time.
+
+    The window subscribes to the camera's full preview in the preview registry while it is shown,
+      so closing the window stops the worker and reopening it does not start a second one.
     """
 
-    def __init__(self, camera_name, worker):
+    def __init__(self, camera_name):
         super().__init__()
 
         self.camera_name = camera_name
-        self.worker = worker  # used to exit the worker when the window closes
+        self.registry = get_preview_registry()
+        self.subscription = None  # the subscription to the full preview while the window is open
         self.setWindowTitle(camera_name)
 
         # If for some reason cannot connect to the camera, show an image of an X instead
-        self.x = make_x_image(width=320, height=240)
+        self.x = make_x_image(*bigPiEyePreviewWorker.PREVIEW_SIZE)
 
         self.img = QtWidgets.QLabel(self)
         self.img.setMaximumSize(4056, 3040)
@@ -104,15 +84,28 @@ class bigPiEyePreviewGUI(basicGUI):
         layout.addWidget(self.img)
         self.setLayout(layout)
 
+    def showEvent(self, event):
+        """showEvent
+        Subscribes to the full preview when the window is shown.
+        Automatically triggered when the window is shown. (built in part of PyQt)
+        """
+        if self.subscription is None:
+            self.subscription = self.registry.subscribe(
+                self.camera_name, "full", self.updatePreview, widget=self.img
+            )
+        event.accept()
+
     def closeEvent(self, event):
         """closeEvent
-        Closes the window and exits the worker.
+        Closes the window and unsubscribes from the full preview, which stops the worker.
         Automatically triggered when the window is closed. (built in part of PyQt)
         """
         self.log.info(
             f"Telling big pi-eye ({self.camera_name}) preview worker to close"
         )
-        self.worker.close()
+        if self.subscription is not None:
+            self.registry.unsubscribe(self.subscription)
+            self.subscription = None
         event.accept()
 
     def updatePreview(self, img):
@@ -120,24 +113,9 @@ class bigPiEyePreviewGUI(basicGUI):
         Update the image displayed in the GUI with a new image
 
         Args:
-            img (numpy array): new image. If None, a large X is displayed instead.
+            img (QImage): new image, already at display size. If None, a large X is displayed instead.
         """
         if img is None:
-            qImg = self.x
-        else:
-            height, width, _ = img.shape
-            bytesPerLine = 3 * width
-            qImg = QtGui.QImage(
-                img.data,
-                width,
-                height,
-                bytesPerLine,
-                QtGui.QImage.Format_RGB888,
-            )
-        pixmap01 = QtGui.QPixmap.fromImage(qImg)
-        preview_img = QtGui.QPixmap(pixmap01)
-        preview_img = preview_img.scaled(
-            4056 // 4, 3040 // 4, QtCore.Qt.KeepAspectRatio
-        )
+            img = self.x
 
-        self.img.setPixmap(preview_img)
+        self.img.setPixmap(QtGui.QPixmap.fromImage(img))
@@ -0,0 +1,186 @@
+import time
+import queue
+import logging
+import itertools
+import threading
+from concurrent.futures import Future
+
+
+class cameraHangError(TimeoutError):
+    """
+    Raised for a camera command that ran past its deadline, see cameraActor.checkHung
+    """
+
+
+class cameraActor:
+    """
+    Owns all access to one camera: every gphoto2 call runs in the actor's own thread, one at a time.
+
+    The preview worker and the capture workers submit commands to the actor and get a Future
+      back. Commands are run in order of priority (CAPTURE, DOWNLOAD, CONFIG, PREVIEW), and in
+      the order they were submitted within a priority. So a capture never waits for more than
+      the command that is already running, ie one live view frame or one download chunk.
+
+    The time from submitting a capture to it starting is logged.
+
+    A gphoto2 call cannot be interrupted, so a camera that stops responding would hold the
+      actor forever. Each kind of command has a deadline, and checkHung (called regularly by
+      the cameraWatchdog) gives up on a command that runs past it: it fails with
+      cameraHangError, and so do all the commands waiting behind it. The stuck thread may
+      still be using the controller, so until the camera is reconnected (see recover) every
+      new command fails straight away, instead of using the same controller from a new thread.
+
+    Args:
+        name (str): name of the camera, ie 'Top'
+        deadlines (dict, optional): 'capture', 'download', 'config' or 'preview' -> seconds a command
+          of that kind may run. Kinds that are not in it have no deadline.
+    """
+
+    CAPTURE = 0
+    DOWNLOAD = 1
+    CONFIG = 2
+    PREVIEW = 3
+
+    PRIORITY_NAMES = {CAPTURE: "capture", DOWNLOAD: "download", CONFIG: "config", PREVIEW: "preview"}
+
+    def __init__(self, name, deadlines=None):
+        self.log = logging.getLogger("UThread")
+        self.name = name
+        self.deadlines = deadlines or {}
+        self.queue = queue.PriorityQueue()
+        self.counter = itertools.count()
+
+        self.lock = threading.Lock()
+        # (priority, started at, future) of the command running now, or None
+        self.running = None
+        # increased whenever a hung thread is replaced, the old thread exits once its command returns
+        self.generation = 0
+        # True from a command hanging until the camera is reconnected, only recover runs meanwhile
+        self.hung = False
+        self._startThread()
+
+    def _startThread(self):
+        self.thread = threading.Thread(
+            target=self._run, args=(self.generation,), name=f"Camera-{self.name}", daemon=True
+        )
+        self.thread.start()
+
+    def submit(self, priority, fn, *args, **kwargs):
+        """submit
+        Queue a command for the camera
+
+        Args:
+            priority (int): CAPTURE, DOWNLOAD, CONFIG or PREVIEW
+            fn (callable): the command, called in the actor thread with args and kwargs
+
+        Returns:
+            future (Future): the result of the command
+        """
+        future = Future()
+        with self.lock:
+            if self.hung:
+                future.set_exception(cameraHangError(f"Camera {self.name} hung and is not reconnected yet"))
+                return future
+            self.queue.put((priority, next(self.counter), time.monotonic(), future, fn, args, kwargs))
+        return future
+
+    def recover(self, fn, *args, **kwargs):
+        """recover
+        Queue the command that reconnects the camera. It is run even while the camera is hung, and
+        if it returns True the actor runs other commands again.
+
+        Args:
+            fn (callable): reconnects the camera, returns True if it is connected
+
+        Returns:
+            future (Future): the result of fn
+        """
+
+        def reconnect():
+            connected = fn(*args, **kwargs)
+            if connected:
+                with self.lock:
+                    self.hung = False
+            return connected
+
+        future = Future()
+        self.queue.put((self.CONFIG, next(self.counter), time.monotonic(), future, reconnect, (), {}))
+        return future
+
+    def call(self, priority, fn, *args, **kwargs):
+        """call
+        Run a command and wait for its result. Commands that call this from the actor thread
+        itself (ie a capture that changes the configuration) are run straight away.
+
+        Returns:
+            the result of fn. Exceptions raised by fn are raised here
+        """
+        if threading.current_thread() is self.thread:
+            return fn(*args, **kwargs)
+        return self.submit(priority, fn, *args, **kwargs).result()
+
+    def checkHung(self):
+        """checkHung
+        Give up on the running command if it has run past its deadline. It fails with cameraHangError,
+        and so does every command waiting behind it, as they would use the same controller. A new
+        thread only runs recover until the camera is reconnected. The stuck thread is left behind,
+        and exits if the command ever returns.
+
+        Returns:
+            (str or None): what hung, or None if nothing did
+        """
+        with self.lock:
+            if self.running is None:
+                return None
+            priority, started_at, future = self.running
+            deadline = self.deadlines.get(self.PRIORITY_NAMES[priority])
+            elapsed = time.monotonic() - started_at
+            if deadline is None or elapsed < deadline:
+                return None
+            self.running = None
+            self.hung = True
+            self.generation += 1
+
+            # nothing can be queued while holding the lock, so this empties the queue before the
+            #   new thread could take a command from it
+            waiting = []
+            while not self.queue.empty():
+                waiting.append(self.queue.get_nowait()[3])
+            self._startThread()
+        description = f"{self.PRIORITY_NAMES[priority]} command hung for {elapsed:.1f} s"
+        future.set_exception(cameraHangError(f"Camera {self.name}: {description}"))
+        for waiting_future in waiting:
+            if waiting_future.set_running_or_notify_cancel():
+                waiting_future.set_exception(
+                    cameraHangError(f"Camera {self.name} hung before this command could run")
+                )
+        if waiting:
+            self.log.info(f"Failed {len(waiting)} commands waiting for camera {self.name}, as it hung")
+        return description
+
+    def _run(self, generation):
+        while True:
+            priority, _, submitted_at, future, fn, args, kwargs = self.queue.get()
+            if not future.set_running_or_notify_cancel():
+                continue
+            if priority == self.CAPTURE:
+                self.log.info(
+                    f"Capture on {self.name} started {1000 * (time.monotonic() - submitted_at):.0f} ms "
+                    f"after it was requested"
+                )
+            with self.lock:
+                self.running = (priority, time.monotonic(), future)
+            result, exception = None, None
+            try:
+                result = fn(*args, **kwargs)
+            except BaseException as ex:
+                exception = ex
+            with self.lock:
+                if generation != self.generation:
+                    # checkHung gave up on this command and has already failed it
+                    return
+                self.running = None
+            if exception is not None:
+                future.set_exception(exception)
+            else:
+                future.set_result(result)
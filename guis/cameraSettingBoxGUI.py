@@ -2,7 +2,6 @@ from guis.basicGUI import basicGUI
 from guis.canonsGUI import canonsGUI
 from guis.piEyedPiperGUI import piEyedPiperGUI
 from PyQt5 import QtGui, QtCore, QtWidgets
-from PyQt5.QtWidgets import * 
 
 class SettingCameraDisplayBox(basicGUI):
         """
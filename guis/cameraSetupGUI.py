@@ -1,7 +1,16 @@
 from guis.basicGUI import basicGUI
 from guis.cameraSettingBoxGUI import SettingCameraDisplayBox
+from guis.previewRegistry import get_preview_registry
 from PyQt5 import QtWidgets
-from PyQt5.QtWidgets import * 
+from PyQt5.QtWidgets import (
+    QCheckBox,
+    QComboBox,
+    QDialog,
+    QLineEdit,
+    QMessageBox,
+    QPushButton,
+    QVBoxLayout,
+)
 import json
 
 """
@@ -318,6 +327,7 @@ class JsonCameraSetting(basicGUI):
         """
         Updates current setting. Sets default setting as current setting if needed.
         Asks cameraSettingBoxGUI to update the camera chosen box area with current setting.
+        Tells the preview registry to stop the previews of the cameras that are turned off, and restart the others.
         """
         # Convert the keys into a list
         keys_list = list(self.settings.keys())
@@ -336,6 +346,8 @@ class JsonCameraSetting(basicGUI):
             
             self.scdb.updateBox(colorStatus=setting, cameraName=cam)
 
+        get_preview_registry().applyCameraSetting(self.currentSetting)
+
     def delete_setting(self, index_to_delete):
         """
         Takes a index number and deletes the corresponding setting. 
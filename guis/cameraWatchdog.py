@@ -0,0 +1,174 @@
+import time
+import logging
+import threading
+
+from guis.settings.settings import (
+    CANON_FAILURE_THRESHOLD,
+    CANON_RECONNECT_MIN_BACKOFF,
+    CANON_RECONNECT_MAX_BACKOFF,
+    CANON_WATCHDOG_INTERVAL,
+)
+
+
+class cameraWatchdog:
+    """
+    Keeps one canon connected.
+
+    Every CANON_WATCHDOG_INTERVAL seconds the watchdog checks the camera's actor for a
+      command that ran past its deadline. Failed commands are counted by recordFailure.
+
+    A camera that hangs, fails CANON_FAILURE_THRESHOLD commands in a row, or cannot be found, is
+      marked down and reconnected in its actor thread (see cameraActor.recover, after a hang
+      nothing else is run with the old connection). Failed reconnects are retried with a backoff
+      that doubles from CANON_RECONNECT_MIN_BACKOFF up to CANON_RECONNECT_MAX_BACKOFF seconds. The
+      other camera and the GUI carry on meanwhile.
+
+    The number of reconnects and the total downtime are logged, and passed to on_status.
+
+    Args:
+        camera (canonGUI): the camera, reconnected with camera.reconnect
+        on_status (callable): called (from any thread) with a short status text whenever it changes
+    """
+
+    def __init__(self, camera, on_status):
+        self.log = logging.getLogger("UThread")
+        self.camera = camera
+        self.on_status = on_status
+        self.lock = threading.Lock()
+
+        self.failures = 0  # commands failed in a row
+        self.down_since = None  # when the camera went down, None while it is up
+        self.hung = False  # whether it went down because a command hung
+        self.reconnecting = False  # whether a reconnect is running
+        self.attempts = 0  # reconnects tried since it went down
+        self.backoff = CANON_RECONNECT_MIN_BACKOFF
+        self.next_attempt = 0.0
+
+        # statistics
+        self.reconnects = 0
+        self.downtime = 0.0
+
+        self.thread = threading.Thread(
+            target=self._run, name=f"Watchdog-{camera.camera_name}", daemon=True
+        )
+        self.thread.start()
+
+    @property
+    def is_down(self):
+        return self.down_since is not None
+
+    def recordSuccess(self):
+        with self.lock:
+            self.failures = 0
+
+    def recordFailure(self, ex):
+        """recordFailure
+        Count a failed command. The camera is marked down after CANON_FAILURE_THRESHOLD failures in a row.
+
+        Args:
+            ex (Exception): what went wrong
+        """
+        with self.lock:
+            self.failures += 1
+            failures = self.failures
+        if failures >= CANON_FAILURE_THRESHOLD:
+            self.markDown(f"{failures} commands failed in a row, the last with: {ex}")
+
+    def markDown(self, reason, hung=False):
+        """markDown
+        Start reconnecting the camera. Does nothing if it is already down.
+
+        Args:
+            reason (str): why, for the log
+            hung (bool, optional): the camera hung, so the old connection is not closed
+              (closing it would most likely hang too). Defaults to False.
+        """
+        with self.lock:
+            if self.down_since is not None:
+                return
+            self.down_since = time.monotonic()
+            self.hung = hung
+            self.failures = 0
+            self.attempts = 0
+            self.backoff = CANON_RECONNECT_MIN_BACKOFF
+            self.next_attempt = self.down_since + self.backoff
+        self.log.info(f"Canon {self.camera.camera_name} is down: {reason}")
+        self.updateStatus()
+
+    def requestReconnect(self, reason):
+        """requestReconnect
+        Reconnect the camera as soon as possible, ie when asked to by the user. Returns straight away.
+
+        Args:
+            reason (str): why, for the log
+        """
+        self.markDown(reason)
+        with self.lock:
+            self.next_attempt = time.monotonic()
+
+    def markUp(self):
+        """markUp
+        The camera is connected again, ie after a reconnect. Does nothing if it was not down.
+        """
+        with self.lock:
+            if self.down_since is None:
+                return
+            down = time.monotonic() - self.down_since
+            self.down_since = None
+            self.reconnects += 1
+            self.downtime += down
+            attempts, reconnects, downtime = self.attempts, self.reconnects, self.downtime
+        self.log.info(
+            f"Canon {self.camera.camera_name} reconnected after {down:.1f} s down and {attempts} attempts. "
+            f"{reconnects} reconnects and {downtime:.1f} s down in total"
+        )
+        self.updateStatus()
+
+    def updateStatus(self):
+        with self.lock:
+            if self.down_since is not None:
+                status = f"Reconnecting... (attempt {self.attempts + 1})"
+            elif self.reconnects:
+                status = f"Reconnected {self.reconnects}x, down {self.downtime:.0f} s in total"
+            else:
+                status = ""
+        self.on_status(status)
+
+    def _run(self):
+        while True:
+            time.sleep(CANON_WATCHDOG_INTERVAL)
+
+            hung = self.camera.actor.checkHung()
+            if hung is not None:
+                self.markDown(hung, hung=True)
+
+            with self.lock:
+                due = (
+                    self.down_since is not None
+                    and not self.reconnecting
+                    and time.monotonic() >= self.next_attempt
+                )
+                if due:
+                    self.reconnecting = True
+                    self.attempts += 1
+                    exit_controller = not self.hung
+            if due:
+                self.camera.actor.recover(
+                    self.camera.reconnect, exit_controller=exit_controller
+                ).add_done_callback(self.reconnectDone)
+
+    def reconnectDone(self, future):
+        connected = future.exception() is None and future.result()
+        with self.lock:
+            self.reconnecting = False
+            if not connected:
+                self.next_attempt = time.monotonic() + self.backoff
+                backoff, self.backoff = self.backoff, min(2 * self.backoff, CANON_RECONNECT_MAX_BACKOFF)
+        if connected:
+            self.markUp()
+        else:
+            reason = f": {future.exception()}" if future.exception() is not None else ""
+            self.log.info(
+                f"Reconnecting canon {self.camera.camera_name} failed{reason}, trying again in {backoff} s"
+            )
+            self.updateStatus()
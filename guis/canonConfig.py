@@ -0,0 +1,152 @@
+import time
+import logging
+import threading
+
+import gphoto2 as gp
+
+
+class canonConfig:
+    """
+    Cache of the gphoto2 configuration tree of one camera.
+
+    Downloading the configuration tree (gp_camera_get_config) and uploading it again
+      (gp_camera_set_config) are each a USB round trip to the camera. The tree is downloaded
+      once and kept, along with the handles of the widgets that have been looked up. Values
+      are changed locally with set/setChoice and only sent to the camera by apply, so several
+      changes go out in a single gp_camera_set_config call.
+
+    Values are read from the cached tree. The tree is only downloaded again when
+      asked for (refresh) or after a reconnect (invalidate).
+
+    round_trips counts the calls to the camera, see takeRoundTrips. apply_time is how long the last
+      upload took.
+    """
+
+    def __init__(self, controller):
+        self.log = logging.getLogger("UThread")
+        self.controller = controller
+        self.lock = threading.RLock()
+
+        self.tree = None  # the cached configuration tree
+        self.widgets = {}  # name -> widget handle in the cached tree
+        self.dirty = set()  # names of the widgets changed since the last apply
+
+        self.round_trips = 0
+        self.apply_time = None  # seconds the last gp_camera_set_config took, None until the first one
+
+    def refresh(self):
+        """refresh
+        Download the configuration tree from the camera. Changes that have not been applied are lost.
+        """
+        with self.lock:
+            self.tree = gp.check_result(gp.gp_camera_get_config(self.controller))
+            self.widgets = {}
+            self.dirty = set()
+            self.round_trips += 1
+
+    def invalidate(self):
+        """invalidate
+        Forget the cached tree, ie after reconnecting. It is downloaded again on next use.
+        """
+        with self.lock:
+            self.tree = None
+            self.widgets = {}
+            self.dirty = set()
+
+    def widget(self, name):
+        """widget
+        Args:
+            name (str): name of the configuration, ie 'imageformat'
+
+        Returns:
+            widget: the handle of the widget in the cached tree, or None if the camera does not have it
+        """
+        with self.lock:
+            if self.tree is None:
+                self.refresh()
+            if name not in self.widgets:
+                OK, widget = gp.gp_widget_get_child_by_name(self.tree, name)
+                self.widgets[name] = widget if OK >= gp.GP_OK else None
+            return self.widgets[name]
+
+    def get(self, name, refresh=False):
+        """get
+        Args:
+            name (str): name of the configuration, ie 'imageformat'
+            refresh (bool, optional): download the tree from the camera first. Defaults to False.
+
+        Returns:
+            value: the current value, or None if the camera does not have this configuration
+        """
+        with self.lock:
+            if refresh:
+                self.refresh()
+            widget = self.widget(name)
+            if widget is None:
+                return None
+            return gp.check_result(gp.gp_widget_get_value(widget))
+
+    def set(self, name, value):
+        """set
+        Change a value in the cached tree. It is sent to the camera by the next apply.
+
+        Args:
+            name (str): name of the configuration, ie 'viewfinder'
+            value: the new value
+
+        Returns:
+            (bool): False if the camera does not have this configuration
+        """
+        with self.lock:
+            widget = self.widget(name)
+            if widget is None:
+                return False
+            if gp.check_result(gp.gp_widget_get_value(widget)) != value:
+                gp.check_result(gp.gp_widget_set_value(widget, value))
+                self.dirty.add(name)
+            return True
+
+    def setChoice(self, name, index):
+        """setChoice
+        Change a radio/menu configuration to one of its choices. It is sent to the camera by the next apply.
+
+        Args:
+            name (str): name of the configuration, ie 'imageformat'
+            index (int): index of the choice. see gphoto2 --get-config <name> for the options
+
+        Returns:
+            (bool): False if the camera does not have this configuration
+        """
+        with self.lock:
+            widget = self.widget(name)
+            if widget is None:
+                return False
+            return self.set(name, gp.check_result(gp.gp_widget_get_choice(widget, index)))
+
+    def apply(self):
+        """apply
+        Send all the changed values to the camera in one gp_camera_set_config call. Does nothing if nothing changed.
+        """
+        with self.lock:
+            if not self.dirty:
+                return
+            start = time.monotonic()
+            try:
+                gp.check_result(gp.gp_camera_set_config(self.controller, self.tree))
+                self.apply_time = time.monotonic() - start
+            except gp.GPhoto2Error:
+                # the cached values may not be what is on the camera any more
+                self.invalidate()
+                raise
+            finally:
+                self.round_trips += 1
+            self.dirty = set()
+
+    def takeRoundTrips(self):
+        """takeRoundTrips
+        Returns:
+            (int): the number of round trips to the camera since the last call
+        """
+        with self.lock:
+            round_trips, self.round_trips = self.round_trips, 0
+            return round_trips
@@ -0,0 +1,236 @@
+import json
+import time
+import logging
+import threading
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+import gphoto2 as gp
+
+from guis.canonConfig import canonConfig
+from guis.settings.settings import CANON_MODEL, CANON_PORT_CACHE
+
+
+class canonDiscovery:
+    """
+    Finds the canon cameras by their 'owner' ('Top' or 'Side'), shared by all the canonGUIs.
+
+    The only way to tell the bodies apart is to initialize each one and read its
+      'ownername' configuration. One scan enumerates the cameras, initializes and reads
+      all the bodies in parallel, and keeps the ones that were found for the canonGUIs
+      that ask for them next.
+
+    The port and serial number of each owner are cached in CANON_PORT_CACHE, so the next
+      time (ie a reconnect or the next start) the camera on the cached port is opened
+      straight away. If it is not the expected camera any more (ie it was plugged into
+      another port), a full scan is done.
+
+    The ports of the cameras handed out to a canonGUI are never probed, as initializing a
+      camera that is in use would disturb it. A canonGUI releases its port when it
+      reconnects.
+    """
+
+    def __init__(self, cache_path=CANON_PORT_CACHE, model=CANON_MODEL):
+        self.log = logging.getLogger("UThread")
+        self.cache_path = Path(cache_path)
+        self.model = model
+        self.lock = threading.Lock()
+
+        # owner -> {"port": port, "serial": serial number}
+        self.ports = self.loadCache()
+
+        # owner -> (controller, config, port) of cameras found but not handed out yet
+        self.found = {}
+
+        # ports of the cameras handed out to a canonGUI, see release
+        self.claimed = set()
+
+        # the abilities are loaded once, the ports are loaded again for every scan, as they change
+        #   when a camera is plugged in again. lookup_path can add to the port list, so it is only
+        #   used while holding lists_lock
+        self.lists_lock = threading.Lock()
+        self.port_info_list = None
+        self.abilities_list = None
+
+    def getController(self, owner):
+        """getController
+        Get the camera with the given owner
+
+        Args:
+            owner (str): The 'owner' of the camera - Defined on the camera itself, ie 'Top'
+
+        Returns:
+            (controller, config, port) or None: the initialized gphoto2 camera, its canonConfig and its port,
+              or None if the camera could not be found
+        """
+        with self.lock:
+            start = time.monotonic()
+            result = self.found.pop(owner, None)
+            if result is None and owner in self.ports:
+                result = self.openCached(owner)
+            if result is None:
+                self.scan()
+                result = self.found.pop(owner, None)
+            if result is not None:
+                self.claimed.add(result[2])
+            self.log.info(
+                f"{'Found' if result is not None else 'Could not find'} canon {owner} "
+                f"in {1000 * (time.monotonic() - start):.0f} ms"
+            )
+            return result
+
+    def release(self, port):
+        """release
+        Called by a canonGUI that stopped using the camera on a port (ie to reconnect), so it can be probed again
+
+        Args:
+            port (str): the port given by getController
+        """
+        with self.lock:
+            self.claimed.discard(port)
+
+    def openCached(self, owner):
+        """openCached
+        Open the camera on the port the owner was last seen on
+
+        Returns:
+            (controller, config, port) or None: None if it is not there, or it is another camera
+        """
+        if self.ports[owner]["port"] in self.claimed:
+            # another canonGUI is using the camera on that port now
+            self.log.info(f"Canon {owner} used to be on {self.ports[owner]['port']}, which is in use")
+            return None
+        probed = self.probe(self.ports[owner]["port"])
+        if probed is None:
+            return None
+        cam_owner, serial, cam, config, port = probed
+        if cam_owner == owner:
+            expected = self.ports[owner].get("serial")
+            if serial != expected:
+                # another body was given the same owner
+                self.log.info(
+                    f"Canon {owner} on {port} has serial number {serial}, it used to be {expected}"
+                )
+                self.ports[owner] = {"port": port, "serial": serial}
+                self.saveCache()
+            return cam, config, port
+        # another camera is on that port now, keep it for whoever asks for it
+        self.log.info(f"Canon {cam_owner} is on the port canon {owner} used to be on")
+        self.remember(cam_owner, serial, cam, config, port)
+        return None
+
+    def scan(self):
+        """scan
+        Enumerate all the cameras and read the owner of every canon body, in parallel
+        """
+        self.loadPorts()
+
+        # get a list of all cameras gphoto2 can detect, and filter it by the correct model
+        #   leaving out the cameras that are already open, or in use by a canonGUI
+        open_ports = {port for _, _, port in self.found.values()} | self.claimed
+        ports = [
+            port for model, port in gp.Camera.autodetect()
+            if model == self.model and port not in open_ports
+        ]
+        if not ports:
+            return
+
+        with ThreadPoolExecutor(max_workers=len(ports)) as executor:
+            results = list(executor.map(self.probe, ports))
+        for probed in results:
+            if probed is not None:
+                self.remember(*probed)
+
+    def remember(self, owner, serial, cam, config, port):
+        if owner in self.found:
+            # found twice, close the older one
+            gp.gp_camera_exit(self.found[owner][0])
+        self.found[owner] = (cam, config, port)
+        if self.ports.get(owner) != {"port": port, "serial": serial}:
+            self.ports[owner] = {"port": port, "serial": serial}
+            self.saveCache()
+
+    def probe(self, port):
+        """probe
+        Initialize the camera on a port and read its owner
+
+        Returns:
+            (owner, serial, controller, config, port) or None if the camera could not be initialized
+        """
+        # create a camera instance
+        cam = gp.check_result(gp.gp_camera_new())
+
+        with self.lists_lock:
+            if self.port_info_list is None:
+                self.loadLists()
+
+            # set said camera instance to look at the port we are interested in
+            idx = self.port_info_list.lookup_path(port)
+            if idx < gp.GP_OK:
+                gp.gp_camera_exit(cam)
+                return None
+            cam.set_port_info(self.port_info_list[idx])
+
+            # set said camera instance to have the abilities of the model we are interested in
+            idx = self.abilities_list.lookup_model(self.model)
+            cam.set_abilities(self.abilities_list[idx])
+
+        # try initializing the camera in question
+        if gp.gp_camera_init(cam) < gp.GP_OK:
+            gp.gp_camera_exit(cam)
+            return None
+        try:
+            # give it a minute to breathe
+            time.sleep(0.1)
+
+            # get the owner and serial number from the camera configuration
+            config = canonConfig(cam)
+            owner = (config.get("ownername") or "").strip()
+            serial = config.get("serialnumber")
+        except gp.GPhoto2Error as ex:
+            self.log.info(f"Exception encountered reading canon on {port}: {ex}")
+            gp.gp_camera_exit(cam)
+            return None
+        return owner, serial, cam, config, port
+
+    def loadPorts(self):
+        # load all the ports again, as they are now
+        with self.lists_lock:
+            self.loadLists()
+
+    def loadLists(self):
+        # must hold lists_lock. the abilities are only loaded the first time
+        self.port_info_list = gp.PortInfoList()
+        self.port_info_list.load()
+        if self.abilities_list is None:
+            self.abilities_list = gp.CameraAbilitiesList()
+            self.abilities_list.load()
+
+    def loadCache(self):
+        try:
+            with open(self.cache_path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def saveCache(self):
+        try:
+            with open(self.cache_path, "w") as f:
+                json.dump(self.ports, f, indent=4)
+        except OSError as ex:
+            self.log.info(f"Could not save canon port cache: {ex}")
+
+
+_discovery = None
+_discovery_lock = threading.Lock()
+
+
+def get_canon_discovery():
+    """get_canon_discovery
+    Returns the canon discovery service shared by the whole application
+    """
+    global _discovery
+    with _discovery_lock:
+        if _discovery is None:
+            _discovery = canonDiscovery()
+        return _discovery
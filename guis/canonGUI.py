@@ -1,15 +1,30 @@
-import io
-
+import os
+import time
+import threading
 import gphoto2 as gp
-from PIL import Image
-from time import sleep
-from PIL.ImageQt import ImageQt
+from collections import deque
 
-from PyQt5 import QtWidgets, QtGui, QtCore
-from PyQt5.QtCore import QMutex
+from PyQt5 import QtWidgets, QtCore
 from guis.workers import previewWorker
+from guis.cameraActor import cameraActor, cameraHangError
+from guis.cameraWatchdog import cameraWatchdog
 from guis.basicGUI import basicGUI, ClickableIMG
-from utils import make_x_image
+from guis.previewCompositor import get_compositor
+from guis.previewRegistry import get_preview_registry, workerSource
+from guis.threadPools import get_thread_pool
+from guis.downloadScheduler import get_download_scheduler
+import startup
+from utils import make_x_image, make_text_image
+from guis.previewDecoder import previewDecoder
+from guis.canonDiscovery import get_canon_discovery
+from guis.settings.settings import (
+    PREVIEW_TARGET_FPS,
+    CANON_SWITCH_IMAGE_FORMAT,
+    CANON_CAPTURE_TO_RAM,
+    CANON_DOWNLOAD_CHUNK_SIZE,
+    CANON_DOWNLOAD_ATTEMPTS,
+    CANON_COMMAND_DEADLINES,
+)
 
 class canonGUI(basicGUI):
     """
@@ -17,46 +32,74 @@ class canonGUI(basicGUI):
 
     The GUI for each Canon camera. Contains most of the code for accessing the
       camera, taking photos, etc.
+
+    All gphoto2 calls go through the camera's cameraActor, which runs them one at a time
+      in its own thread: captures first, then downloads, configuration and live view frames.
     """
 
+    # size (width, height) the preview is displayed at
+    PREVIEW_SIZE = (640, 420)
+
+    # length of the window (in seconds) used to calculate the preview frame rate and latency
+    FPS_WINDOW = 5
+
+    # emitted (in the GUI thread) once connecting to the camera is done, whether or not it was found
+    ready = QtCore.pyqtSignal()
+
+    # emitted (from any thread) with the connection status shown under the title
+    statusChanged = QtCore.pyqtSignal(str)
+
     def __init__(self, location, **kwargs):
         super(canonGUI, self).__init__(**kwargs)
         self.location = location
 
-        # Used to prevent multiple threads from accessing the same data at once
-        self.mutex = QMutex()
+        # runs all the commands for the camera, one at a time
+        self.actor = cameraActor(location, CANON_COMMAND_DEADLINES)
+
+        # whether the camera is configured for the live view. Reset whenever the configuration
+        #   changes, so it is checked again before the next frame
+        self.live_view_ready = False
 
-        # the gphoto2 instance of the camera controller
-        self.controller = self.getController(owner=location)
+        # the gphoto2 instance of the camera controller, and the cache of its configuration.
+        #   Both are None until connectCamera has found the camera
+        self.controller = None
+        self.config = None
+        # port of the camera, given by the discovery service
+        self.port = None
+        self.connecting = True
 
-        # the preview cannot work if the camera is set to raw format
-        self.setImageFormatJPEG()
+        # (time received, seconds it took) of recent preview frames, used for getPreviewStats
+        self.preview_times = deque(maxlen=1000)
+        self.stats_lock = threading.Lock()
+        self.stats_logged_at = time.monotonic()
 
-        # flag used to stop the preview when the camera is taking a photo
-        self.pause_preview = False
-        self.preview_paused = False
+        # the live view is run by the preview registry, which makes the worker when needed
+        self.registry = get_preview_registry()
+        self.preview_worker = None
+        self.preview_subscription = None
 
         # if the camera cannot provide a preview, or the camera cannot be found, display an x instead
-        self.x = make_x_image(640, 420)
+        self.x = make_x_image(*self.PREVIEW_SIZE)
 
-        self.initUI()
+        # displayed until the camera is connected
+        self.connecting_image = make_text_image(*self.PREVIEW_SIZE, "Connecting...")
 
-        # start the preview worker thread
-        self.startPreviewWorker()
+        # draws the previews of all the cameras together, once per display refresh
+        self.compositor = get_compositor()
 
-    def set_pause_preview(self, val):
-        """set_pause_preview
-        Threadsafe way to set the value of the pause_preview flag.
+        # decodes the live view frames at display size in the preview worker thread
+        self.decoder = previewDecoder(*self.PREVIEW_SIZE)
 
-        Args:
-            val (bool): True or False
-        """
-        self.mutex.lock()
-        self.pause_preview = val
-        self.mutex.unlock()
-        while self.preview_paused != True:
-            print('waiting for preview to be actually paused')
-            sleep(0.05)
+        self.initUI()
+        self.compositor.submit(self.preview, self.connecting_image)
+
+        # reconnects the camera if it hangs or keeps failing
+        self.watchdog = cameraWatchdog(self, self.statusChanged.emit)
+
+        # connect to the camera in the background, so the window does not wait for it.
+        #   The preview worker thread is started once it is connected
+        self.ready.connect(self.startPreviewWorker)
+        self.connectCamera()
 
     @property
     def camera_name(self):
@@ -67,6 +110,40 @@ class canonGUI(basicGUI):
         """
         return self.location
 
+    @property
+    def is_offline(self):
+        """is_offline
+        True if the camera could not be found when connecting to it, or it is down and being reconnected
+        """
+        return self.controller is None or self.watchdog.is_down
+
+    def connectCamera(self):
+        """connectCamera
+        Find the camera and configure it for the session. This runs in the camera's actor thread,
+        and ready is emitted when it is done.
+        """
+        start = time.monotonic()
+
+        def connect():
+            self.controller = self.getController(owner=self.location)
+            # set the image format and capture target used for the whole session
+            self.configureSession()
+
+        def done(future):
+            if future.exception() is not None:
+                self.log.info("Exception encountered: " + str(future.exception()))
+            self.connecting = False
+            if self.controller is None:
+                # keep looking for it in the background
+                self.watchdog.markDown("not found")
+            self.log.info(
+                f"Canon {self.camera_name} {'is offline' if self.is_offline else 'connected'} "
+                f"after {1000 * (time.monotonic() - start):.0f} ms"
+            )
+            self.ready.emit()
+
+        self.actor.submit(cameraActor.CONFIG, connect).add_done_callback(done)
+
     def initUI(self):
         """initUI
         initializes the UI for the canon camera
@@ -74,10 +151,15 @@ class canonGUI(basicGUI):
         self.title = QtWidgets.QLabel(f"{self.camera_name} Canon Preview:")
 
         self.preview = ClickableIMG(self)
-        self.preview.setMaximumSize(640, 420)
+        self.preview.setMaximumSize(*self.PREVIEW_SIZE)
         self.preview.clicked.connect(self.openIMG)
 
+        # number of reconnects and downtime, see cameraWatchdog
+        self.statusLabel = QtWidgets.QLabel("")
+        self.statusChanged.connect(self.statusLabel.setText)
+
         self.grid.addWidget(self.title, 0, 0, 1, 2)
+        self.grid.addWidget(self.statusLabel, 1, 0, 1, 8)
         self.grid.addWidget(self.preview, 2, 0, 1, 8)
 
         self.setLayout(self.grid)
@@ -87,55 +169,115 @@ class canonGUI(basicGUI):
         Attempts to reinitialize the camera. This is necessary in case something goes wrong with the connection
         For example, if a camera is unplugged.
         """
-        if self.controller is not None:
-            self.pause_preview = True
+        # the watchdog reconnects it in the actor thread, so the GUI does not wait for a camera that hangs
+        self.watchdog.requestReconnect("reinitialize requested")
+
+    def reconnect(self, exit_controller=True):
+        """reconnect
+        Close the connection to the camera and find it again. Runs in the camera's actor thread,
+        used by reinitCamera and the cameraWatchdog.
+
+        Args:
+            exit_controller (bool, optional): close the old connection first. Not done after the camera hung,
+              as that would most likely hang too. Defaults to True.
+
+        Returns:
+            (bool): True if the camera was found and configured
+        """
+        if self.controller is not None and exit_controller:
             print('Shutting Down ADDRESS:',self.camera_name)
             try:
                 gp.check_result(gp.gp_camera_exit(self.controller))
             except Exception as ex:
                 self.log.info("Exception encountered: " + str(ex))
+        if self.port is not None:
+            # let the discovery service look at this port again, to find the camera on it
+            get_canon_discovery().release(self.port)
+            self.port = None
 
         self.controller = self.getController(owner=self.location)
-        self.setImageFormatJPEG()
-        self.pause_preview = False
+        self.live_view_ready = False
+        self.configureSession()
+        return self.controller is not None
 
     def closeEvent(self, event):
         """closeEvent
-        Closes the window and exits the worker.
+        Closes the window and unsubscribes from the live view, which exits the worker.
         Automatically triggered when the window is closed. (built in part of PyQt)
         """
         self.log.info(
             f"Telling canon ({self.camera_name}) preview worker to close"
         )
-        self.preview_worker.close()
+        if self.preview_subscription is not None:
+            self.registry.unsubscribe(self.preview_subscription)
         event.accept()
 
     def startPreviewWorker(self):
         """startPreviewWorker
-        Start the preview worker thread and add it to the overall threadpool.
-        This preview worker runs the updatePreview function below.
+        Register the live view with the preview registry and subscribe to it. The registry
+        starts the preview worker thread in the preview threadpool.
+        This preview worker runs the getPreview function below, and the frames go to updatePreview.
         """
-        self.preview_worker = previewWorker(self)
-        self.preview_worker.signals.result.connect(self.updatePreview)
-        self.threadpool.start(self.preview_worker)
+        self.registry.registerSource(
+            self.camera_name,
+            "liveview",
+            lambda: workerSource(self.makePreviewWorker, get_thread_pool("preview")),
+        )
+        self.preview_subscription = self.registry.subscribe(
+            self.camera_name, "liveview", self.updatePreview, widget=self.preview
+        )
+
+    def makePreviewWorker(self):
+        """makePreviewWorker
+        Make a new preview worker. Used by the preview registry whenever the live view is started.
+        When the worker stops (ie the camera is turned off in the camera setting), it turns the live view off.
+        """
+        self.preview_worker = previewWorker(
+            self, target_fps=PREVIEW_TARGET_FPS["canon"], on_exit=self.endLiveView
+        )
+        return self.preview_worker
+
+    def endLiveView(self, worker):
+        """endLiveView
+        Turn the live view of the camera off, so it does not keep running while no one is looking at the preview.
+        It is turned back on by the next gp_camera_capture_preview.
+
+        Args:
+            worker (previewWorker): the worker that stopped
+        """
+        if self.controller is None or worker is not self.preview_worker:
+            # a new worker has already been started, so the live view is still needed
+            return
+
+        def end():
+            # the preview turns the viewfinder on behind the cache's back, so read it again
+            self.config.refresh()
+            self.config.set("viewfinder", 0)
+            self.config.apply()
+            self.live_view_ready = False
+
+        try:
+            self.actor.call(cameraActor.CONFIG, end)
+            self.log.info(f"Turned off live view of canon {self.camera_name}")
+        except Exception as ex:
+            self.log.info("Exception encountered: " + str(ex))
 
     def updatePreview(self, img):
         """updatePreview
         Updates the GUI with a new image
 
         Args:
-            img (numpy array): new image. if None, show a large x
+            img (QImage): new image, already at display size. if None, show a large x
         """
 
         # if the image is none, a large x is displayed
+        if img is not None and img is not self.x:
+            startup.mark("First preview frame")
         if img is None:
             img = self.x
 
-        # update the GUI image
-        pixmap01 = QtGui.QPixmap.fromImage(img)
-        preview_img = QtGui.QPixmap(pixmap01)
-        preview_img = preview_img.scaled(640, 420, QtCore.Qt.KeepAspectRatio)
-        self.preview.setPixmap(preview_img)
+        # the compositor draws all the previews together on its next tick
+        self.compositor.submit(self.preview, img)
 
     def openIMG(self):
         """openIMG
@@ -155,83 +297,22 @@ class canonGUI(basicGUI):
         Returns:
             controller or None: returns an instance of the gphoto2 camera controller or None if unable to find the camera
         """
-        # get a list of all cameras gphoto2 can detect
-        cameras = gp.Camera.autodetect()
-
-        # filter this list by those that are the correct model
-        canons = [x for x in cameras if x[0] == "Canon EOS R5"]
-
-        # loop over each canon camera and look for the one with the correct 'Owner'/'Location' ('Top' or 'Side')
-        for cam_data in canons:
-            model, port = cam_data
-
-            # load all the ports
-            port_info_list = gp.PortInfoList()
-            port_info_list.load()
-
-            # load all the abilities
-            abilities_list = gp.CameraAbilitiesList()
-            abilities_list.load()
-
-            # create a camera instance
-            cam = gp.check_result(gp.gp_camera_new())
-
-            # set said camera instance to look at the port we are interested in
-            idx = port_info_list.lookup_path(port)
-            cam.set_port_info(port_info_list[idx])
-
-            # set said camera instance to have the abilities of the model we are interested in
-            idx = abilities_list.lookup_model(model)
-            cam.set_abilities(abilities_list[idx])
-            
-            # try initializing the camera in question
-            OK = gp.gp_camera_init(cam)
-            if OK >= gp.GP_OK:
-                # if that worked, get the 'owner' parameter from the camera
-                cam_owner = self.getOwner(cam)
-
-                if cam_owner.strip() == owner:
-                    # if it is in the correct owner, return the controller instance
-                    self.port = port
-                    return cam
-                else:
-                    # otherwise try to nicely exit the controller
-                    gp.check_result(gp.gp_camera_exit(cam))
-
-        # return None if no cameras were found
-        return None
-
-    def getOwner(self, camera):
-        """getOwner
-        get the 'owner' configuration from the camera itself. This is used to specify
-        which physical camera we are controlling
-
-        Args:
-            camera (object): Either None, or an instance of the gphoto2 camera class
-
-        Returns:
-            owner (str): Either None (if something went wrong) or the owner string from the camera
-        """
-        if camera is None:
+        # the discovery service knows which port the camera was last on, and finds it if it moved
+        result = get_canon_discovery().getController(owner)
+        if result is None:
+            # return None if the camera was not found
+            self.config = None
+            self.port = None
             return None
-        else:
-            # give it a minute to breathe
-            sleep(0.1)
-
-            # get the camera configuration
-            context = gp.gp_context_new()
-            config = gp.check_result(gp.gp_camera_get_config(camera, context))
 
-            # get the owner parameter in the configuration
-            owner = gp.check_result(gp.gp_widget_get_child_by_name(config, "ownername"))
-
-            # return the string of the owner
-            return gp.check_result(gp.gp_widget_get_value(owner))
+        # keep the configuration that was downloaded to check the owner
+        controller, self.config, self.port = result
+        return controller
 
     def takePhoto(self):
         """takePhoto
         Tells the canon to capture and store a photo (At this point does not download the photo onto the computer
-        only stores it locally)
+        only stores it locally). The capture goes ahead of anything else waiting for the camera.
 
         Returns:
             filepath (str): path to the photo on the camera
@@ -239,22 +320,49 @@ class canonGUI(basicGUI):
         if self.controller is None:
             return None
         else:
-            # Lock the mutex so other threads cannot access the pause_preview variable
-            self.set_pause_preview(True)
+            return self.actor.call(cameraActor.CAPTURE, self.capturePhoto)
+
+    def capturePhoto(self):
+        """capturePhoto
+        Runs in the camera's actor thread, see takePhoto
+        """
+        # only count the round trips made for this shot
+        self.config.takeRoundTrips()
 
+        start = time.monotonic()
+        if CANON_SWITCH_IMAGE_FORMAT:
             # We want to capture raw format images
             self.setImageFormatRAW()
-            
-            # capture a photo and return the filepath on the camera
-            file_path = self.controller.capture(gp.GP_CAPTURE_IMAGE)
+        switched = time.monotonic()
 
+        # capture a photo and return the filepath on the camera
+        file_path = self.controller.capture(gp.GP_CAPTURE_IMAGE)
+        captured = time.monotonic()
+
+        if CANON_SWITCH_IMAGE_FORMAT:
             # the preview cannot preview if the camera is set to raw format
             self.setImageFormatJPEG()
+            switch_time = (switched - start) + (time.monotonic() - captured)
+            switching = f"{1000 * switch_time:.0f} ms spent switching the image format"
+        elif self.config.apply_time is not None:
+            # switching would have been two uploads of the configuration, so estimate
+            #   what was saved from how long the last upload to this camera took
+            switching = (
+                f"about {2000 * self.config.apply_time:.0f} ms saved by not switching the image format"
+            )
+        else:
+            switching = "image format not switched"
 
-            # Lock the mutex so other threads cannot access the pause_preview variable
-            self.set_pause_preview(False)
+        self.log.info(
+            f"Canon {self.camera_name} used {self.config.takeRoundTrips()} config round trips for this shot, "
+            f"trigger to capture took {1000 * (captured - start):.0f} ms, {switching}"
+        )
+        if not file_path.name.lower().endswith(".cr3"):
+            self.log.warning(
+                f"Canon {self.camera_name} captured {file_path.name}, expected a CR3 file"
+            )
 
-            return file_path
+        return file_path
 
     def savePhoto(self, camera_path, local_folder):
         """savePhoto
@@ -273,18 +381,138 @@ class canonGUI(basicGUI):
         else:
             # get full target path with filename
             target = local_folder / (self.camera_name + ".cr3")
-            self.set_pause_preview(True)
-            # get the camera file location from the camera
-            camera_file = self.controller.file_get(
-                camera_path.folder, camera_path.name, gp.GP_FILE_TYPE_NORMAL
-            )
-            self.set_pause_preview(False)
-            # save the image to the target location
-            camera_file.save(
-                str(target)
-            )  # CR: Check: can wrap in str() so works on windows
+
+            for attempt in range(1, CANON_DOWNLOAD_ATTEMPTS + 1):
+                try:
+                    # download the image from the camera straight into the target location
+                    self.downloadFile(camera_path, target)
+                    break
+                except Exception as ex:
+                    # a camera that hung is reconnected first, so trying again straight away would fail too
+                    if attempt == CANON_DOWNLOAD_ATTEMPTS or isinstance(ex, cameraHangError):
+                        # the capture may be the only copy, so it is left on the camera
+                        self.log.warning(
+                            f"Downloading {camera_path.name} from canon {self.camera_name} failed: {ex}. "
+                            f"It is kept on the camera in {camera_path.folder}"
+                        )
+                        raise
+                    self.log.info(
+                        f"Downloading {camera_path.name} from canon {self.camera_name} failed: {ex}, trying again"
+                    )
+
+            # the download was checked, so free the camera's RAM for the next capture
+            self.discardPhoto(camera_path)
             return True
 
+    def discardPhoto(self, camera_path):
+        """discardPhoto
+        Deletes a photo from the camera's RAM once it is saved, or when it will not be saved (ie because
+        another camera failed). Photos on the memory card are kept.
+
+        Args:
+            camera_path (object): a gphoto2 path object, as returned by takePhoto
+        """
+        if self.controller is None or not CANON_CAPTURE_TO_RAM:
+            return
+        try:
+            self.actor.call(
+                cameraActor.DOWNLOAD,
+                self.controller.file_delete,
+                camera_path.folder,
+                camera_path.name,
+            )
+        except Exception as ex:
+            self.log.info("Exception encountered: " + str(ex))
+
+    def downloadFile(self, camera_path, target):
+        """downloadFile
+        Download a file from the camera in chunks of CANON_DOWNLOAD_CHUNK_SIZE, so the whole file is
+        never held in memory. The chunks are written to a partial file next to the target, which
+        is only moved into place once its size matches the size of the file on the camera.
+        Each chunk is a separate command for the actor, so a capture can go in between two chunks.
+
+        Args:
+            camera_path (object): a gphoto2 path object. representing the path to the file on the canon camera
+            target (pathlib path object): where to save the file
+
+        Raises:
+            IOError: if the downloaded file is incomplete. The partial file is deleted whenever the
+              download fails.
+        """
+        start = time.monotonic()
+        info = self.actor.call(
+            cameraActor.DOWNLOAD,
+            self.controller.file_get_info,
+            camera_path.folder,
+            camera_path.name,
+        )
+        size = info.file.size
+
+        buffer = memoryview(bytearray(min(CANON_DOWNLOAD_CHUNK_SIZE, max(size, 1))))
+        partial = target.with_name(target.name + ".partial")
+        offset = 0
+        try:
+            # wait for a free slot on the usb link
+            with get_download_scheduler().transfer(self.camera_name) as transfer:
+                with open(partial, "wb") as f:
+                    while offset < size:
+                        read = self.actor.call(
+                            cameraActor.DOWNLOAD,
+                            self.controller.file_read,
+                            camera_path.folder,
+                            camera_path.name,
+                            gp.GP_FILE_TYPE_NORMAL,
+                            offset,
+                            buffer,
+                        )
+                        if read <= 0:
+                            break
+                        f.write(buffer[:read])
+                        offset += read
+                        transfer.addBytes(read)
+        except Exception:
+            # do not leave a truncated file in the specimen folder
+            partial.unlink(missing_ok=True)
+            raise
+
+        if offset != size or partial.stat().st_size != size:
+            partial.unlink()
+            raise IOError(
+                f"Download of {camera_path.name} from canon {self.camera_name} is incomplete: "
+                f"got {offset} of {size} bytes"
+            )
+        os.replace(partial, target)
+
+        duration = time.monotonic() - start
+        self.log.info(
+            f"Downloaded {camera_path.name} ({size / 2**20:.1f} MiB) from canon {self.camera_name} "
+            f"in {1000 * duration:.0f} ms, in chunks of {len(buffer) / 2**20:.1f} MiB"
+        )
+
+    def configureSession(self):
+        """configureSession
+        Set the configuration the camera keeps for the whole session, in one upload:
+
+        The image format is RAW, or JPEG if the format is switched to RAW just for each capture
+          (CANON_SWITCH_IMAGE_FORMAT).
+        The captures are kept in the camera's RAM if CANON_CAPTURE_TO_RAM, otherwise they are written
+          to the memory card.
+        """
+        if self.controller is None:
+            return
+
+        def configure():
+            # Check options with 'gphoto2 --get-config /main/imgsettings/imageformat'
+            #   0 is Large Fine JPEG, 21 is RAW
+            self.config.setChoice("imageformat", 0 if CANON_SWITCH_IMAGE_FORMAT else 21)
+            # Check options with 'gphoto2 --get-config /main/settings/capturetarget'
+            #   0 is Internal RAM, 1 is Memory card
+            self.config.setChoice("capturetarget", 0 if CANON_CAPTURE_TO_RAM else 1)
+            self.config.apply()
+            self.live_view_ready = False
+
+        self.actor.call(cameraActor.CONFIG, configure)
+
     def setImageFormatJPEG(self):
         """setImageFormatJPEG
         sets the image format for taking images and previews to JPEG
@@ -310,63 +538,120 @@ class canonGUI(basicGUI):
             value (int): the value corresponding to the option on the camera. see gphoto2 --list-all-config for options
         """
         if self.controller is not None:
-            config = gp.check_result(gp.gp_camera_get_config(self.controller))
-            config_item = gp.check_result(gp.gp_widget_get_child_by_name(config, name))
 
-            value = gp.check_result(gp.gp_widget_get_choice(config_item, value))
-            gp.check_result(gp.gp_widget_set_value(config_item, value))
-            gp.check_result(gp.gp_camera_set_config(self.controller, config))
+            def set_config():
+                # only uploads the configuration if the value actually changed
+                self.config.setChoice(name, value)
+                self.config.apply()
+                # the live view has to be checked again against the new configuration
+                self.live_view_ready = False
+
+            self.actor.call(cameraActor.CONFIG, set_config)
+
+    def startLiveView(self):
+        """startLiveView
+        Check and set the configuration the live view needs. Only done once per session (until
+        the configuration changes or the camera is reconnected), instead of before every frame.
+        Runs in the camera's actor thread, as part of a live view frame.
+
+        Returns:
+            (bool): False if the camera cannot preview with its current configuration
+        """
+        # find the image format config item
+        # camera dependent - 'imageformat' is 'imagequality' on some
+        image_format = self.config.get("imageformat")
+        # make sure it's not raw, unless the camera can preview while set to raw
+        if (
+            CANON_SWITCH_IMAGE_FORMAT
+            and image_format is not None
+            and "raw" in image_format.lower()
+        ):
+            print("Cannot preview raw images")
+            return False
+        # need to set this on my Canon 350d to get preview to work at all
+        self.config.setChoice("capturesizeclass", 2)
+        self.config.apply()
+        self.live_view_ready = True
+        self.log.info(f"Configured live view of canon {self.camera_name}")
+        return True
+
+    def getPreviewStats(self):
+        """getPreviewStats
+        Frame rate and average time per frame (capture and decode) of the live view over the last FPS_WINDOW seconds,
+        and the stats of the preview worker's mailbox
+
+        Returns:
+            stats (dict): 'fps', 'latency_ms', 'queue_depth' (frames waiting to be drawn) and 'dropped' (frames dropped so far)
+        """
+        now = time.monotonic()
+        with self.stats_lock:
+            latencies = [
+                latency for t, latency in self.preview_times if now - t <= self.FPS_WINDOW
+            ]
+        worker = self.preview_worker
+        return {
+            "fps": len(latencies) / self.FPS_WINDOW,
+            "latency_ms": 1000 * sum(latencies) / len(latencies) if latencies else 0.0,
+            "queue_depth": worker.mailbox.queue_depth if worker is not None else 0,
+            "dropped": worker.mailbox.dropped if worker is not None else 0,
+        }
+
+    def recordPreviewFrame(self, latency):
+        """recordPreviewFrame
+        Keep track of a preview frame for getPreviewStats, and log the stats every FPS_WINDOW seconds
+
+        Args:
+            latency (float): seconds it took to capture and decode the frame
+        """
+        now = time.monotonic()
+        with self.stats_lock:
+            self.preview_times.append((now, latency))
+        if now - self.stats_logged_at >= self.FPS_WINDOW:
+            self.stats_logged_at = now
+            stats = self.getPreviewStats()
+            self.log.debug(
+                f"Canon {self.camera_name} live view: {stats['fps']:.1f} fps, "
+                f"{stats['latency_ms']:.1f} ms per frame, "
+                f"{stats['queue_depth']} frames waiting, {stats['dropped']} dropped"
+            )
 
     def getPreview(self):
         """getPreview
 
         Returns:
-            image (numpy array): Returns x image if failed, otherwise returns the preview as a numpy array from the camera
+            image (QImage): Returns x image if failed, otherwise returns the preview from the camera at display size
         """
-        if self.controller is None:
+        if self.is_offline:
             return self.x
 
-        if self.pause_preview:
-            self.mutex.lock()
-            self.preview_paused = True
-            self.mutex.unlock()
-            sleep(0.05)
-        else:
-            self.mutex.lock()
-            self.preview_paused = False
-            self.mutex.unlock()
-            # required configuration will depend on camera type!
-            # get configuration tree
-            try:
-                config = gp.check_result(gp.gp_camera_get_config(self.controller))
-                # find the image format config item
-                # camera dependent - 'imageformat' is 'imagequality' on some
-                OK, image_format = gp.gp_widget_get_child_by_name(config, "imageformat")
-                if OK >= gp.GP_OK:
-                    # get current setting
-                    value = gp.check_result(gp.gp_widget_get_value(image_format))
-                    # make sure it's not raw
-                    if "raw" in value.lower():
-                        print("Cannot preview raw images")
-                        return 1
-                # find the capture size class config item
-                # need to set this on my Canon 350d to get preview to work at all
-                OK, capture_size_class = gp.gp_widget_get_child_by_name(
-                    config, "capturesizeclass"
-                )
-                if OK >= gp.GP_OK:
-                    # set value
-                    value = gp.check_result(gp.gp_widget_get_choice(capture_size_class, 2))
-                    gp.check_result(gp.gp_widget_set_value(capture_size_class, value))
-                    # set config
-                    gp.check_result(gp.gp_camera_set_config(self.controller, config))
-                # capture preview image (not saved to camera memory card)
-                camera_file = gp.check_result(gp.gp_camera_capture_preview(self.controller))
-                file_data = gp.check_result(gp.gp_file_get_data_and_size(camera_file))
-                # display image
-                # data = memoryview(file_data)
-                image = ImageQt(Image.open(io.BytesIO(file_data)))
-                return image
-            except Exception as ex:
-                self.log.info("Exception encountered:" + str(ex))
+        try:
+            start = time.monotonic()
+            file_data = self.actor.call(cameraActor.PREVIEW, self.captureFrame)
+            self.watchdog.recordSuccess()
+            if file_data is None:
                 return None
+            # decode the image at display size, in the preview worker thread
+            image = self.decoder.decode(file_data)
+            self.recordPreviewFrame(time.monotonic() - start)
+            return image
+        except Exception as ex:
+            self.log.info("Exception encountered:" + str(ex))
+            # check the configuration again before the next frame
+            self.live_view_ready = False
+            # reconnect if it keeps failing
+            self.watchdog.recordFailure(ex)
+            return None
+
+    def captureFrame(self):
+        """captureFrame
+        Runs in the camera's actor thread, see getPreview
+
+        Returns:
+            file_data: the live view JPEG, or None if the camera cannot preview
+        """
+        # required configuration will depend on camera type! only checked once per session
+        if not self.live_view_ready and not self.startLiveView():
+            return None
+        # capture preview image (not saved to camera memory card)
+        camera_file = gp.check_result(gp.gp_camera_capture_preview(self.controller))
+        return gp.check_result(gp.gp_file_get_data_and_size(camera_file))
@@ -21,6 +21,7 @@ class canonsGUI(basicGUI):
         super(canonsGUI, self).__init__(**kwargs)
         # self.inst_title = self.headerLabel("Fire the Canons!")
 
+        # each canon connects in the background, see canonGUI.connectCamera
         self.topCanonGUI = canonGUI("Top", **kwargs)
         self.sideCanonGUI = canonGUI("Side", **kwargs)
 
@@ -57,5 +58,6 @@ class canonsGUI(basicGUI):
         In case there is an issue connecting to the cameras,
            this function attempts to reconnect to both cameras
         """
+        # both are reconnected in the background, the time it took is logged by their watchdogs
         self.topCanonGUI.reinitCamera()
         self.sideCanonGUI.reinitCamera()
@@ -0,0 +1,178 @@
+import time
+import logging
+import itertools
+import threading
+from contextlib import contextmanager
+
+from guis.settings.settings import (
+    CAMERA_LINKS,
+    LINK_MAX_TRANSFERS,
+    DEFAULT_LINK_MAX_TRANSFERS,
+)
+
+
+class linkStats:
+    """
+    Throughput of one link, measured over the time the link was busy with at least one transfer
+    """
+
+    def __init__(self):
+        self.transfers = 0
+        self.bytes = 0
+        self.busy_time = 0.0
+        self.active = 0  # transfers currently running over the link
+        self.busy_since = None
+
+    @property
+    def throughput(self):
+        """throughput
+        Returns:
+            (float): bytes per second while the link was busy
+        """
+        return self.bytes / self.busy_time if self.busy_time else 0.0
+
+
+class downloadScheduler:
+    """
+    Decides when each camera may download a photo, based on the link (usb bus, hub or
+      usb-ethernet gadget) it is on.
+
+    Each link only runs LINK_MAX_TRANSFERS[link] downloads at once, and the others
+      wait. When a slot frees up, the waiting download that is expected to take the longest
+      goes first, which gets the whole specimen done soonest. The expected time is the
+      duration of the camera's previous download.
+
+    The throughput of each link is measured, so the caps can be tuned, see stats.
+
+    Usage:
+        with get_download_scheduler().transfer(camera_name) as transfer:
+            ...
+            transfer.addBytes(len(chunk))
+    """
+
+    def __init__(self, links=CAMERA_LINKS, max_transfers=LINK_MAX_TRANSFERS):
+        self.log = logging.getLogger("UThread")
+        self.links = links
+        self.max_transfers = max_transfers
+        self.condition = threading.Condition()
+        self.counter = itertools.count()
+
+        # link -> list of (expected seconds, order, camera name) waiting for the link
+        self.waiting = {}
+
+        # link -> linkStats
+        self.link_stats = {}
+
+        # camera name -> seconds its last download took
+        self.expected = {}
+
+    def linkOf(self, camera_name):
+        """linkOf
+        Returns:
+            link (str): the link the camera is on. Cameras that are not in CAMERA_LINKS get a link of their own
+        """
+        return self.links.get(camera_name, camera_name)
+
+    @contextmanager
+    def transfer(self, camera_name):
+        """transfer
+        Wait for a free slot on the camera's link, and hold it while the body of the with statement runs
+
+        Args:
+            camera_name (str): name of the camera, ie 'Top' or 'pieye-ant.local'
+
+        Returns:
+            transfer (transferRecord): call addBytes on it with the number of bytes transferred
+        """
+        link = self.linkOf(camera_name)
+        record = transferRecord()
+        requested = time.monotonic()
+        self._acquire(link, camera_name)
+        started = time.monotonic()
+        try:
+            yield record
+        finally:
+            duration = time.monotonic() - started
+            self._release(link, camera_name, record.bytes, duration)
+            self.log.info(
+                f"{camera_name} transferred {record.bytes / 2**20:.1f} MiB over {link} in "
+                f"{1000 * duration:.0f} ms after waiting {1000 * (started - requested):.0f} ms for the link"
+            )
+
+    def stats(self):
+        """stats
+        Returns:
+            stats (dict): link -> number of transfers, MiB transferred and MiB/s while the link was busy
+        """
+        with self.condition:
+            return {
+                link: {
+                    "transfers": stats.transfers,
+                    "MiB": stats.bytes / 2**20,
+                    "MiB/s": stats.throughput / 2**20,
+                }
+                for link, stats in self.link_stats.items()
+            }
+
+    def logStats(self):
+        for link, stats in self.stats().items():
+            self.log.info(
+                f"Link {link}: {stats['transfers']} transfers, {stats['MiB']:.1f} MiB, "
+                f"{stats['MiB/s']:.1f} MiB/s while busy"
+            )
+
+    def _acquire(self, link, camera_name):
+        with self.condition:
+            stats = self.link_stats.setdefault(link, linkStats())
+            # longest expected download first, then first come first served
+            entry = (-self.expected.get(camera_name, 0.0), next(self.counter), camera_name)
+            waiting = self.waiting.setdefault(link, [])
+            waiting.append(entry)
+            limit = self.max_transfers.get(link, DEFAULT_LINK_MAX_TRANSFERS)
+            self.condition.wait_for(
+                lambda: stats.active < limit and min(waiting) == entry
+            )
+            waiting.remove(entry)
+            stats.active += 1
+            if stats.active == 1:
+                stats.busy_since = time.monotonic()
+            # others waiting for the link may be next in line now
+            self.condition.notify_all()
+
+    def _release(self, link, camera_name, n_bytes, duration):
+        with self.condition:
+            stats = self.link_stats[link]
+            stats.active -= 1
+            stats.transfers += 1
+            stats.bytes += n_bytes
+            if stats.active == 0:
+                stats.busy_time += time.monotonic() - stats.busy_since
+            self.expected[camera_name] = duration
+            self.condition.notify_all()
+
+
+class transferRecord:
+    """
+    Counts the bytes of one transfer
+    """
+
+    def __init__(self):
+        self.bytes = 0
+
+    def addBytes(self, n_bytes):
+        self.bytes += n_bytes
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_download_scheduler():
+    """get_download_scheduler
+    Returns the download scheduler shared by the whole application
+    """
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = downloadScheduler()
+        return _scheduler
@@ -1,18 +1,18 @@
-import cv2
-import json
-import imageio
-import numpy as np
-from PyQt5 import QtWidgets, QtCore, QtGui
-from PyQt5.QtCore import QRunnable, pyqtSlot, QThreadPool
-from PyQt5.QtWidgets import QHBoxLayout, QApplication
-
-import tempfile
+from PyQt5 import QtWidgets, QtCore
+
+import time
 from pathlib import Path
 
-from utils import try_url, make_x_image
-from guis.workers import WorkerSignals, previewWorker
+import startup
+from utils import try_url, make_x_image, make_text_image
+from network import get_circuit_breaker
 from guis.basicGUI import basicGUI, ClickableIMG
+from guis.previewCompositor import get_compositor
 from guis.bigPiEyePreviewGUI import bigPiEyePreviewGUI, bigPiEyePreviewWorker
+from guis.previewRegistry import get_preview_registry, engineSource, workerSource
+from guis.threadPools import get_thread_pool
+from guis.downloadScheduler import get_download_scheduler
+from guis.settings.settings import STORAGE_PATH, PIEYE_DOWNLOAD_CHUNK_SIZE
 
 class piEyeGUI(basicGUI):
     """
@@ -25,7 +25,16 @@ class piEyeGUI(basicGUI):
       We then query the API to get the camera preview and tell the pi to take an image
     """
 
-    def __init__(self, address, **kwargs):
+    # folder inside the storage folder where photos are kept until they are saved
+    STAGING_FOLDER = ".staging"
+
+    # size (width, height) the preview is displayed at
+    PREVIEW_SIZE = (150, 112)
+
+    # emitted once the first preview is received, or the pi-eye is found to be offline
+    ready = QtCore.pyqtSignal()
+
+    def __init__(self, address, preview_engine=None, **kwargs):
         super(piEyeGUI, self).__init__(**kwargs)
 
         # This is the ip address of the piEye on the local network. Usually something like "pieye-dragonfly.local"
@@ -34,17 +43,40 @@ class piEyeGUI(basicGUI):
         #   Accessing the previews is then something like: "http://pieye-ant.local:8080/camera/preview"
         self.address = address
 
+        # The previews of all the pi-eyes are fetched by one shared previewEngine,
+        #   and the registry makes sure each preview stream is only fetched once
+        self.preview_engine = preview_engine
+        self.registry = get_preview_registry()
+
+        # window with the larger focus preview, made the first time the preview is clicked
+        self.big_preview = None
+
         # If the camera disconnects, show a big x
-        self.x = make_x_image(320, 240)
+        self.x = make_x_image(*self.PREVIEW_SIZE)
+
+        # displayed until the first preview is received
+        self.connecting_image = make_text_image(*self.PREVIEW_SIZE, "Connecting...")
+        self.connecting = True
+
+        # draws the previews of all the cameras together, once per display refresh
+        self.compositor = get_compositor()
 
         self.initUI()
+        self.compositor.submit(self.preview, self.connecting_image)
 
-        self.startPreviewWorker()
+        self.startPreview()
 
     @property
     def camera_name(self):
         return self.address
 
+    @property
+    def is_offline(self):
+        """is_offline
+        True if the last few requests to this pi-eye failed, so it is assumed to be unplugged or turned off
+        """
+        return get_circuit_breaker(self.camera_name).is_offline
+
     def initUI(self):
          
 
@@ -67,34 +99,69 @@ class piEyeGUI(basicGUI):
     def takePhoto(self):
         """takePhoto
 
-        Takes a photo and saves it to a temporary folder on this computer.
+        Takes a photo and streams it to a staging folder next to the storage folder, so it can
+        be moved into the specimen folder without copying it. The photo is written in chunks
+        as it arrives, it is never held in memory as a whole.
         Returns:
             The name of the image that was taken, or None if there was an error
 
         """
         take_img_url = f"http://{self.camera_name}:8080/capture"
-        response = try_url(take_img_url)
+        start = time.monotonic()
+        response = try_url(take_img_url, stream=True)
         self.log.info(f"Taking pi-eye photo {self.camera_name}")
         if response is None:
             self.log.warn(f"No Response for pi-eye at address {self.camera_name}")
             return None
         else:
-            tmpdir = Path(tempfile.gettempdir())
-
-            # get filename from response
-            filename = (
-                response.headers["Content-Disposition"].split("=")[1].replace('"', "")
+            filepath = None
+            try:
+                staging_path = Path(STORAGE_PATH) / self.STAGING_FOLDER
+                staging_path.mkdir(parents=True, exist_ok=True)
+
+                # get filename from response
+                filename = (
+                    response.headers["Content-Disposition"].split("=")[1].replace('"', "")
+                )
+                self.log.info(f"Saving photo {filename}")
+                filepath = staging_path / filename
+                size = 0
+                # the photo is taken, wait for a free slot on the link before downloading it
+                with get_download_scheduler().transfer(self.camera_name) as transfer:
+                    with open(filepath, "wb") as f:
+                        for chunk in response.iter_content(PIEYE_DOWNLOAD_CHUNK_SIZE):
+                            f.write(chunk)
+                            size += len(chunk)
+                            transfer.addBytes(len(chunk))
+
+                expected = response.headers.get("Content-Length")
+                if expected is not None and int(expected) != size:
+                    self.log.warn(
+                        f"Photo from pi-eye {self.camera_name} is incomplete: got {size} of {expected} bytes"
+                    )
+                    filepath.unlink()
+                    return None
+            except Exception as ex:
+                self.log.warn(f"Could not download photo from pi-eye {self.camera_name}: {ex}")
+                # do not leave the partial photo behind in the staging folder
+                if filepath is not None:
+                    filepath.unlink(missing_ok=True)
+                return None
+            finally:
+                response.close()
+
+            duration = time.monotonic() - start
+            self.log.info(
+                f"Got {size / 2**20:.1f} MiB from pi-eye {self.camera_name} in {1000 * duration:.0f} ms "
+                f"({size / duration / 2**20:.1f} MiB/s)"
             )
-            self.log.info(f"Saving photo {filename}")
-            filepath = tmpdir / filename
-            open(filepath, "wb").write(response.content)
-
             return filepath
 
     def savePhoto(self, filepath, folder):
         """savePhoto
 
-        Moves the photo from the temporary folder to the folder specified, with the name specified.
+        Moves the photo from the staging folder to the folder specified, with the name specified.
+        The staging folder is on the same volume, so this is a single atomic rename.
 
         """
         # open file at filepath
@@ -105,77 +172,87 @@ class piEyeGUI(basicGUI):
             newpath = Path(folder) / filename
 
             # move file to new location
-            Path(filepath).rename(newpath)
+            Path(filepath).replace(newpath)
+            return True
 
         except:
             self.log.warn(f"Could not save photo {filepath} to {folder}")
             return False
 
+    def discardPhoto(self, filepath):
+        """discardPhoto
+        Deletes a photo from the staging folder that will not be saved, ie because another camera failed.
+
+        Args:
+            filepath (str): path of the photo, as returned by takePhoto
+        """
+        try:
+            Path(filepath).unlink(missing_ok=True)
+        except OSError as ex:
+            self.log.warn(f"Could not delete photo {filepath}: {ex}")
+
     def openFocusedPreviewWindow(self):
         """openFocusedPreviewWindow
         Opens a new window with a larger slower preview. This allows for dynamically adjusting the focus.
         Although the update is slow, as it asks the Pi-Eye to capture a full-resolution image each time.
+        The window is reused if it was opened before, the registry makes sure only one full preview loop runs.
         """
         self.log.info("Opening Focused Pi-Eye Preview Window")
-        self.big_preview_worker = bigPiEyePreviewWorker(self.camera_name)
-
-        self.big_preview = bigPiEyePreviewGUI(self.camera_name, self.big_preview_worker)
+        if self.big_preview is None:
+            self.big_preview = bigPiEyePreviewGUI(self.camera_name)
         self.big_preview.show()
-
-        self.big_preview_worker.signals.result.connect(self.big_preview.updatePreview)
-        self.threadpool.start(self.big_preview_worker)
+        self.big_preview.raise_()
+        self.big_preview.activateWindow()
 
     def closeEvent(self, event):
         """closeEvent
-        Closes the window and exits the worker.
+        Closes the window and unsubscribes from the preview.
         Automatically triggered when the window is closed. (built in part of PyQt)
         """
-        self.log.info(f"Telling pi-eye ({self.camera_name}) preview worker to close")
-        self.preview_worker.close()
+        self.log.info(f"Unsubscribing from pi-eye ({self.camera_name}) preview")
+        self.registry.unsubscribe(self.preview_subscription)
         event.accept()
 
-    def startPreviewWorker(self):
-        """startPreviewWorker
-        In order for all the previews to update asynchronously we give each
-        preview its own worker thread. This worker thread will run the updatePreview function below
-        """
-        self.preview_worker = previewWorker(self)
-        self.preview_worker.signals.result.connect(self.updatePreview)
-        self.threadpool.start(self.preview_worker)
-
-    def getPreview(self):
-        """getPreview
-        Get the preview from the Pi-Eye url. If something goes wrong, return None
+    def startPreview(self):
+        """startPreview
+        Register the preview streams of this pi-eye with the preview registry, and subscribe the
+        thumbnail to the quick preview. The quick preview is polled by the shared preview engine,
+        which polls all the pi-eyes asynchronously from one thread. The full preview (for the
+        focus window) is only started while the focus window is open.
         """
         self.preview_url = f"http://{self.camera_name}:8080/quick-preview"
-        response = try_url(self.preview_url)
-
-        if response is None:
-            return None
-        else:
-            data = imageio.imread(response.content)
-            return data
+        self.registry.registerSource(
+            self.camera_name,
+            "quick",
+            lambda: engineSource(
+                self.preview_engine, self.camera_name, self.preview_url, self.PREVIEW_SIZE
+            ),
+        )
+        self.registry.registerSource(
+            self.camera_name,
+            "full",
+            lambda: workerSource(
+                lambda: bigPiEyePreviewWorker(self.camera_name),
+                get_thread_pool("preview"),
+            ),
+        )
+        self.preview_subscription = self.registry.subscribe(
+            self.camera_name, "quick", self.updatePreview, widget=self.preview
+        )
 
     def updatePreview(self, img):
         """updatePreview
-        Given an image as a numpy array, update the preview in the GUI.
+        Given an image as a QImage, already decoded at display size by the preview engine, update the preview in the GUI.
           If something went wrong with getting the image, the image will be None.
           Then this function updates the preview to show a giant X
         """
+        if self.connecting and (img is not None or self.is_offline):
+            self.connecting = False
+            self.ready.emit()
+
+        if img is not None:
+            startup.mark("First preview frame")
         if img is None:
-            qImg = self.x
-        else:
-            height, width, _ = img.shape
-            bytesPerLine = 3 * width
-            qImg = QtGui.QImage(
-                img.data,
-                width,
-                height,
-                bytesPerLine,
-                QtGui.QImage.Format_RGB888,
-            )
-        pixmap01 = QtGui.QPixmap.fromImage(qImg)
-        preview_img = QtGui.QPixmap(pixmap01)
-        preview_img = preview_img.scaled(150, 150, QtCore.Qt.KeepAspectRatio)
+            img = self.x
 
-        self.preview.setPixmap(preview_img)
+        self.compositor.submit(self.preview, img)
@@ -1,6 +1,7 @@
 from PyQt5 import QtWidgets
 from guis.basicGUI import basicGUI
 from guis.piEyeGUI import piEyeGUI
+from guis.previewEngine import previewEngine
 
 
 class piEyedPiperGUI(basicGUI):
@@ -14,6 +15,12 @@ class piEyedPiperGUI(basicGUI):
         self.inst_title = self.headerLabel("Pi Eyed Piper")
         #self.inst_desc = QtWidgets.QLabel("Previews of all pi-Eyes")
 
+        # One event loop polls the previews of all the pi-eyes
+        self.preview_engine = previewEngine()
+        kwargs["preview_engine"] = self.preview_engine
+        # close its connections and stop its thread when the application quits
+        QtWidgets.QApplication.instance().aboutToQuit.connect(self.preview_engine.stop)
+
         # Initialize each pi-eye
         self.piEyeAnt = piEyeGUI("pieye-ant.local", **kwargs)
         self.piEyeBeetle = piEyeGUI("pieye-beetle.local", **kwargs)
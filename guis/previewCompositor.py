@@ -0,0 +1,111 @@
+import zlib
+import time
+import logging
+
+from PyQt5 import QtGui
+from PyQt5.QtCore import QObject, QTimer
+
+
+class previewCompositor(QObject):
+    """
+    Draws the live previews of all the cameras together, once per display refresh.
+
+    Instead of every camera repainting its preview as soon as a frame arrives, the
+      frames are collected and applied to their labels in one timer tick, so Qt can
+      repaint them all at once. A frame is skipped if it has the same content as the
+      frame already shown. The content hash is normally calculated by the
+      previewDecoder in the worker thread and stored in the QImage text "digest".
+      The timer only runs while there are frames waiting.
+
+    The time spent on previews in the GUI thread is measured, and reported every
+      second in gui_ms_per_second (and in the debug log).
+    """
+
+    def __init__(self, refresh_rate=None):
+        super(previewCompositor, self).__init__()
+        self.log = logging.getLogger("UThread")
+
+        if refresh_rate is None:
+            screen = QtGui.QGuiApplication.primaryScreen()
+            refresh_rate = screen.refreshRate() if screen is not None else 60
+        self.timer = QTimer(self)
+        self.timer.setInterval(max(1, int(1000 / refresh_rate)))
+        self.timer.timeout.connect(self.tick)
+
+        self.pending = {}  # label -> latest frame that has not been drawn yet
+        self.shown = {}  # label -> digest of the frame currently shown
+
+        # statistics
+        self.drawn = 0
+        self.skipped = 0
+        self.gui_ms_per_second = 0.0
+        self.busy_time = 0.0
+        self.window_start = time.perf_counter()
+
+    def submit(self, label, image):
+        """submit
+        Queue a frame to be drawn on the next tick. Replaces any frame still waiting for that label.
+
+        Args:
+            label (QLabel): the label the frame should be drawn in
+            image (QImage): the frame, already at display size
+        """
+        start = time.perf_counter()
+        self.pending[label] = image
+        if not self.timer.isActive():
+            self.timer.start()
+        self.busy_time += time.perf_counter() - start
+
+    def tick(self):
+        """tick
+        Draw all the waiting frames
+        """
+        start = time.perf_counter()
+        pending, self.pending = self.pending, {}
+        for label, image in pending.items():
+            digest = self.digest(image)
+            if self.shown.get(label) == digest:
+                self.skipped += 1
+                continue
+            label.setPixmap(QtGui.QPixmap.fromImage(image))
+            self.shown[label] = digest
+            self.drawn += 1
+
+        if not self.pending:
+            self.timer.stop()
+
+        now = time.perf_counter()
+        self.busy_time += now - start
+        if now - self.window_start >= 1:
+            self.gui_ms_per_second = 1000 * self.busy_time / (now - self.window_start)
+            self.log.debug(
+                f"Previews took {self.gui_ms_per_second:.1f} ms/s of GUI time, "
+                f"{self.drawn} frames drawn and {self.skipped} unchanged frames skipped so far"
+            )
+            self.busy_time = 0.0
+            self.window_start = now
+
+    @staticmethod
+    def digest(image):
+        """digest
+        The content hash of a frame. Uses the one calculated by the decoder if there is one.
+        """
+        digest = image.text("digest")
+        if digest:
+            return digest
+        pointer = image.constBits()
+        pointer.setsize(image.byteCount())
+        return str(zlib.crc32(pointer))
+
+
+_compositor = None
+
+
+def get_compositor():
+    """get_compositor
+    Returns the compositor shared by all the previews. Must be called from the GUI thread.
+    """
+    global _compositor
+    if _compositor is None:
+        _compositor = previewCompositor()
+    return _compositor
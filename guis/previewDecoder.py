@@ -0,0 +1,119 @@
+import io
+import zlib
+import logging
+
+import numpy as np
+from PIL import Image
+from PyQt5 import QtGui
+
+# libjpeg-turbo is optional (pip install PyTurboJPEG). Without it PIL is used, which is a bit slower
+try:
+    from turbojpeg import TurboJPEG, TJPF_RGB
+except ImportError:
+    TurboJPEG = None
+
+
+_turbo = None
+
+
+def get_turbojpeg():
+    """get_turbojpeg
+    Returns a shared TurboJPEG instance, or None if libjpeg-turbo is not available
+    """
+    global _turbo
+    if _turbo is None and TurboJPEG is not None:
+        try:
+            _turbo = TurboJPEG()
+        except (OSError, RuntimeError) as ex:
+            logging.getLogger("UThread").info(f"libjpeg-turbo not available, using PIL: {ex}")
+            _turbo = False
+    return _turbo or None
+
+
+class previewDecoder:
+    """
+    Decodes preview JPEGs straight to the size they are displayed at.
+
+    Meant to run in the worker thread that fetched the frame, so the GUI thread only has to
+      turn the QImage into a pixmap. JPEGs can be decoded at 1/2, 1/4 or 1/8 of their size
+      for much less work than a full decode, so the decoder picks the smallest of those that
+      is still at least the display size (PIL draft mode, or libjpeg-turbo scaling if it is
+      installed) and then resizes the rest of the way.
+
+    The QImage buffer is reused between frames. Writing into it detaches it (Qt's implicit
+      sharing) if the GUI thread is still holding the previous frame, so this is safe.
+
+    A hash of the JPEG is stored in the QImage text "digest", so the previewCompositor
+      can skip frames that did not change without hashing them in the GUI thread.
+    """
+
+    def __init__(self, width, height):
+        self.size = (width, height)
+        self.image = None  # reused output buffer
+        self.turbo = get_turbojpeg()
+
+    def decode(self, data):
+        """decode
+        Args:
+            data (bytes): the JPEG file
+
+        Returns:
+            image (QImage): the image, scaled to fit inside (width, height) keeping the aspect ratio
+        """
+        if self.turbo is not None:
+            array = self._decodeTurbo(data)
+        else:
+            array = self._decodePIL(data)
+        return self._toQImage(array, str(zlib.crc32(data)))
+
+    def _decodePIL(self, data):
+        image = Image.open(io.BytesIO(data))
+        # only decode at the lowest scale that is still larger than the display size
+        image.draft("RGB", self.size)
+        image = image.convert("RGB")
+        image.thumbnail(self.size, Image.BILINEAR)
+        return np.asarray(image)
+
+    def _decodeTurbo(self, data):
+        width, height, _, _ = self.turbo.decode_header(data)
+
+        # the smallest scaling factor that is still larger than the display size
+        scaling_factor = (1, 1)
+        for num, denom in self.turbo.scaling_factors:
+            if num > denom:
+                continue
+            scaled = (width * num // denom, height * num // denom)
+            if (
+                scaled[0] >= self.size[0] or scaled[1] >= self.size[1]
+            ) and num / denom < scaling_factor[0] / scaling_factor[1]:
+                scaling_factor = (num, denom)
+
+        array = self.turbo.decode(
+            data, pixel_format=TJPF_RGB, scaling_factor=scaling_factor
+        )
+        if array.shape[1] > self.size[0] or array.shape[0] > self.size[1]:
+            image = Image.fromarray(array)
+            image.thumbnail(self.size, Image.BILINEAR)
+            array = np.asarray(image)
+        return array
+
+    def _toQImage(self, array, digest):
+        height, width, _ = array.shape
+        if (
+            self.image is None
+            or self.image.width() != width
+            or self.image.height() != height
+        ):
+            self.image = QtGui.QImage(width, height, QtGui.QImage.Format_RGB888)
+
+        # bits() detaches the buffer if the previous frame is still in use somewhere else
+        pointer = self.image.bits()
+        pointer.setsize(self.image.byteCount())
+        buffer = np.frombuffer(pointer, np.uint8).reshape(
+            height, self.image.bytesPerLine()
+        )
+        buffer[:, : 3 * width] = array.reshape(height, 3 * width)
+        self.image.setText("digest", digest)
+
+        # a shallow copy, which shares the buffer until one of them is written to
+        return QtGui.QImage(self.image)
@@ -0,0 +1,348 @@
+import time
+import socket
+import asyncio
+import logging
+import threading
+from collections import deque
+from urllib.parse import urlsplit
+
+from PyQt5.QtCore import QObject
+
+from network import get_host_resolver, get_circuit_breaker, url_with_address
+from guis.workers import frameMailbox, framePacer
+from guis.previewDecoder import previewDecoder
+from guis.settings.settings import (
+    HTTP_CONNECT_TIMEOUT,
+    HTTP_READ_TIMEOUT,
+    PROBE_TIMEOUT,
+    PREVIEW_TARGET_FPS,
+)
+
+
+class previewEngine(QObject):
+    """
+    Polls the quick preview of every Pi-Eye from a single asyncio event loop.
+
+    All Pi-Eyes share one background thread: each camera gets a coroutine that fetches frames
+      over a keep-alive connection, decodes them at display size, and hands them to the GUI thread
+      through the camera's frameMailbox. Adding more cameras does not add more threads.
+      The mailbox only keeps the latest frame, and each camera is paced by a framePacer.
+
+    Cameras that are offline (see network.circuitBreaker) are not polled, they are
+      only probed with a short timeout until they come back.
+    """
+
+    # length of the window (in seconds) used to calculate the frame rates
+    FPS_WINDOW = 5
+
+    def __init__(
+        self,
+        target_fps=PREVIEW_TARGET_FPS["pieye"],
+        connect_timeout=HTTP_CONNECT_TIMEOUT,
+        read_timeout=HTTP_READ_TIMEOUT,
+    ):
+        super(previewEngine, self).__init__()
+        self.log = logging.getLogger("UThread")
+
+        # frame rate to aim for for each camera, and the request timeouts
+        self.target_fps = target_fps
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+
+        # cache of the resolved pi-eye addresses, shared with the http client
+        self.resolver = get_host_resolver()
+
+        # camera name -> preview url, polling task, mailbox and decoder
+        self.urls = {}
+        self.tasks = {}
+        self.mailboxes = {}
+        self.decoders = {}
+
+        # camera name -> asyncio.Event, cleared while polling the camera is paused
+        self.resume_events = {}
+
+        # camera name -> framePacer
+        self.pacers = {}
+
+        # camera name -> timestamps of recently received frames, used for the frame rates
+        self.frame_times = {}
+        self.stats_lock = threading.Lock()
+        self.stats_logged_at = time.monotonic()
+
+        self.loop = None
+        self.thread = None
+        self.session = None
+
+    def start(self):
+        """start
+        Start the event loop in its own thread. Does nothing if it is already running.
+        """
+        if self.thread is not None:
+            return
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(
+            target=self.loop.run_forever, name="PreviewEngine", daemon=True
+        )
+        self.thread.start()
+        self.log.info("Started pi-eye preview engine")
+
+    def stop(self):
+        """stop
+        Cancel all the polling tasks, close the connections and stop the event loop.
+        """
+        if self.thread is None:
+            return
+        future = asyncio.run_coroutine_threadsafe(self._shutdown(), self.loop)
+        try:
+            future.result(timeout=self.read_timeout)
+        except Exception as ex:
+            self.log.info("Exception encountered stopping preview engine: " + str(ex))
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout=self.read_timeout)
+        self.thread = None
+        if not self.loop.is_running():
+            self.loop.close()
+        self.loop = None
+
+    def addCamera(self, camera_name, url, display_size):
+        """addCamera
+        Start polling a camera. Must be called from the GUI thread.
+
+        Args:
+            camera_name (str): name of the camera, ie 'pieye-dragonfly.local'
+            url (str): url of the preview, ie 'http://pieye-dragonfly.local:8080/quick-preview'
+            display_size (tuple): (width, height) the preview is displayed at
+
+        Returns:
+            mailbox (frameMailbox): the frames are delivered through mailbox.result. Each frame is a
+              QImage at display size, or None if it could not be fetched
+        """
+        self.start()
+        if camera_name not in self.mailboxes:
+            self.mailboxes[camera_name] = frameMailbox()
+            self.decoders[camera_name] = previewDecoder(*display_size)
+        mailbox = self.mailboxes[camera_name]
+        decoder = self.decoders[camera_name]
+        self.loop.call_soon_threadsafe(self._addCamera, camera_name, url, mailbox, decoder)
+        return mailbox
+
+    def removeCamera(self, camera_name):
+        """removeCamera
+        Stop polling a camera.
+
+        Args:
+            camera_name (str): name of the camera, ie 'pieye-dragonfly.local'
+        """
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self._removeCamera, camera_name)
+        self.mailboxes.pop(camera_name, None)
+        self.decoders.pop(camera_name, None)
+
+    def setPaused(self, camera_name, paused):
+        """setPaused
+        Pause or resume polling a camera. Resuming takes effect immediately.
+        """
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self._setPaused, camera_name, paused)
+
+    def setRateScale(self, camera_name, rate_scale):
+        """setRateScale
+        Poll a camera at a fraction of the target frame rate, ie 0.2 for a fifth.
+        """
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self._setRateScale, camera_name, rate_scale)
+
+    def getFrameRates(self):
+        """getFrameRates
+        Frame rate of each camera over the last FPS_WINDOW seconds
+
+        Returns:
+            frame_rates (dict): camera name -> frames per second
+        """
+        now = time.monotonic()
+        with self.stats_lock:
+            return {
+                camera_name: sum(now - t <= self.FPS_WINDOW for t in times) / self.FPS_WINDOW
+                for camera_name, times in self.frame_times.items()
+            }
+
+    def getMailboxStats(self):
+        """getMailboxStats
+        Returns:
+            stats (dict): camera name -> (frames waiting to be drawn, frames dropped so far)
+        """
+        return {
+            camera_name: (mailbox.queue_depth, mailbox.dropped)
+            for camera_name, mailbox in list(self.mailboxes.items())
+        }
+
+    def _addCamera(self, camera_name, url, mailbox, decoder):
+        # runs in the event loop thread
+        if camera_name in self.tasks:
+            return
+        self.urls[camera_name] = url
+        with self.stats_lock:
+            self.frame_times[camera_name] = deque(maxlen=1000)
+        resume = asyncio.Event()
+        resume.set()
+        self.resume_events[camera_name] = resume
+        pacer = framePacer(self.target_fps)
+        self.pacers[camera_name] = pacer
+        self.tasks[camera_name] = self.loop.create_task(
+            self._poll(camera_name, url, mailbox, decoder, resume, pacer)
+        )
+
+    def _setPaused(self, camera_name, paused):
+        # runs in the event loop thread
+        resume = self.resume_events.get(camera_name)
+        if resume is None:
+            return
+        if paused:
+            resume.clear()
+        else:
+            resume.set()
+
+    def _setRateScale(self, camera_name, rate_scale):
+        # runs in the event loop thread
+        pacer = self.pacers.get(camera_name)
+        if pacer is not None:
+            pacer.rate_scale = rate_scale
+
+    def _removeCamera(self, camera_name):
+        # runs in the event loop thread
+        task = self.tasks.pop(camera_name, None)
+        if task is not None:
+            task.cancel()
+        self.urls.pop(camera_name, None)
+        self.resume_events.pop(camera_name, None)
+        self.pacers.pop(camera_name, None)
+        with self.stats_lock:
+            self.frame_times.pop(camera_name, None)
+
+    def _getSession(self):
+        # the session has to be created inside the event loop, so it is created on first use.
+        #   limit_per_host=1 keeps exactly one keep-alive connection open per pi-eye
+        import aiohttp
+
+        if self.session is None:
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit_per_host=1, keepalive_timeout=60),
+                timeout=aiohttp.ClientTimeout(
+                    sock_connect=self.connect_timeout, sock_read=self.read_timeout
+                ),
+            )
+        return self.session
+
+    async def _shutdown(self):
+        tasks = list(self.tasks.values())
+        for camera_name in list(self.tasks):
+            self._removeCamera(camera_name)
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def _poll(self, camera_name, url, mailbox, decoder, resume, pacer):
+        """_poll
+        Fetch frames from a single camera until the task is cancelled. Waits while resume is cleared.
+        """
+        parts = urlsplit(url)
+        breaker = get_circuit_breaker(parts.hostname)
+        delay = pacer.period
+        while True:
+            if not resume.is_set():
+                await resume.wait()
+            await asyncio.sleep(delay)
+            delay = pacer.period
+
+            if breaker.is_offline:
+                # wait for the next probe instead of polling a camera known to be offline
+                if not breaker.claimProbe():
+                    await asyncio.sleep(breaker.secondsUntilProbe())
+                    continue
+                if not await self._probe(parts.hostname, parts.port or 80):
+                    breaker.recordFailure()
+                    continue
+                breaker.recordSuccess()
+
+            start = time.monotonic()
+            image = await self._fetch(url, breaker, decoder)
+            if image is not None:
+                with self.stats_lock:
+                    self.frame_times[camera_name].append(time.monotonic())
+            mailbox.post(image)
+            delay = pacer.nextDelay(time.monotonic() - start, backlog=mailbox.pending)
+            self._logStats()
+
+    def _logStats(self):
+        """_logStats
+        Log the frame rate and mailbox stats of every camera, at most once every FPS_WINDOW seconds
+        """
+        # runs in the event loop thread
+        now = time.monotonic()
+        if now - self.stats_logged_at < self.FPS_WINDOW:
+            return
+        self.stats_logged_at = now
+        frame_rates = self.getFrameRates()
+        for camera_name, (queue_depth, dropped) in self.getMailboxStats().items():
+            self.log.debug(
+                f"Pi-eye {camera_name} preview: {frame_rates.get(camera_name, 0.0):.1f} fps, "
+                f"{queue_depth} frames waiting, {dropped} dropped"
+            )
+
+    async def _resolve(self, hostname):
+        # only resolve the hostname (in a helper thread) if it is not already cached
+        address = self.resolver.resolve(hostname, block=False)
+        if address is None:
+            address = await self.loop.run_in_executor(None, self.resolver.resolve, hostname)
+        return address
+
+    async def _probe(self, hostname, port):
+        """_probe
+        Cheap check of whether an offline camera is back: just open a connection to it.
+        """
+        try:
+            address = await self._resolve(hostname)
+            _, writer = await asyncio.wait_for(
+                asyncio.open_connection(address, port), PROBE_TIMEOUT
+            )
+            writer.close()
+            return True
+        except (OSError, asyncio.TimeoutError):
+            self.resolver.invalidate(hostname)
+            return False
+
+    async def _fetch(self, url, breaker, decoder):
+        """_fetch
+        Get and decode a single preview frame. If something goes wrong, return None
+        """
+        # aiohttp takes a while to import, so it is loaded in the event loop thread instead of at startup
+        import aiohttp
+
+        hostname = urlsplit(url).hostname
+        try:
+            resolved_url, headers = url_with_address(url, await self._resolve(hostname))
+
+            async with self._getSession().get(resolved_url, headers=headers) as response:
+                # the camera answered, so it is online, even if the response is an error
+                breaker.recordSuccess()
+                response.raise_for_status()
+                content = await response.read()
+            return decoder.decode(content)
+        except (aiohttp.ClientConnectorError, socket.gaierror) as err:
+            # could not resolve the hostname, or could not connect to the address
+            self.resolver.invalidate(hostname)
+            breaker.recordFailure()
+            self.log.debug(
+                f'Exception encountered connecting to url: "{url}", Exception raised: "{err}"'
+            )
+        except aiohttp.ClientResponseError as err:
+            self.log.debug(f'Error response from url: "{url}", Exception raised: "{err}"')
+        except (aiohttp.ClientError, asyncio.TimeoutError) as err:
+            breaker.recordFailure()
+            self.log.debug(
+                f'Exception encountered connecting to url: "{url}", Exception raised: "{err}"'
+            )
+        except Exception as e:
+            self.log.debug(f'Error decoding preview from url: "{url}", Exception raised: "{e}"')
+        return None
@@ -0,0 +1,358 @@
+import sip
+import logging
+from functools import partial
+
+from PyQt5.QtCore import QObject, QEvent
+
+from guis.settings.settings import PREVIEW_INACTIVE_RATE, DOWNLOAD_PREVIEW_RATE
+
+
+class workerSource:
+    """
+    Source running a previewWorker (or subclass) in a threadpool.
+
+    Args:
+        make_worker (callable): returns a new worker in paced mode
+        threadpool (workerPool): the threadpool to run the worker in
+    """
+
+    def __init__(self, make_worker, threadpool):
+        self.make_worker = make_worker
+        self.threadpool = threadpool
+        self.worker = None
+
+    def start(self):
+        self.worker = self.make_worker()
+        self.threadpool.start(self.worker)
+        return self.worker.mailbox
+
+    def stop(self):
+        self.worker.close()
+        self.worker = None
+
+    def setPaused(self, paused):
+        self.worker.setPaused(paused)
+
+    def setRateScale(self, rate_scale):
+        self.worker.setRateScale(rate_scale)
+
+
+class engineSource:
+    """
+    Source polling a camera from the shared asyncio previewEngine.
+    """
+
+    def __init__(self, engine, camera_name, url, display_size):
+        self.engine = engine
+        self.camera_name = camera_name
+        self.url = url
+        self.display_size = display_size
+
+    def start(self):
+        return self.engine.addCamera(self.camera_name, self.url, self.display_size)
+
+    def stop(self):
+        self.engine.removeCamera(self.camera_name)
+
+    def setPaused(self, paused):
+        self.engine.setPaused(self.camera_name, paused)
+
+    def setRateScale(self, rate_scale):
+        self.engine.setRateScale(self.camera_name, rate_scale)
+
+
+class previewStream:
+    """
+    State of one (camera, stream type) in the registry
+    """
+
+    def __init__(self, factory):
+        self.factory = factory  # makes the source
+        self.source = None  # the running source, None while nobody is subscribed
+        self.mailbox = None
+        self.subscribers = []
+        self.widgets = {}  # subscriber callback -> the widget showing the frames, or None
+        self.pause_reasons = set()  # the source is paused while this is not empty
+        self.active = True  # whether one of the windows showing the stream is the active window
+        self.rate_scale = 1.0
+
+
+class previewRegistry(QObject):
+    """
+    Owns exactly one acquisition loop per camera and stream type.
+
+    Cameras register a factory for each stream they can provide (ie "quick" for the
+      pi-eye thumbnails, "full" for the focus window, "liveview" for the canons).
+      Consumers subscribe to a stream with a callback. The loop is started when the first
+      consumer subscribes and stopped when the last one unsubscribes, and each frame is
+      fanned out to all the subscribers in the GUI thread.
+
+    A source is the acquisition loop of one stream (ie workerSource or engineSource). It has
+      start, which starts the loop and returns the frameMailbox the frames are delivered through,
+      stop, setPaused(paused) and setRateScale(rate_scale).
+
+    Subscribers can pass the widget that shows the frames. A stream is paused while none of
+      its widgets are visible (hidden, or their window is minimized), and it runs at
+      PREVIEW_INACTIVE_RATE while none of their windows is the active window. It resumes
+      as soon as a widget is shown again.
+
+    Cameras that are turned off in the current camera setting (see JsonCameraSetting) have
+      all their streams stopped, and they are started again when the camera is turned back on.
+
+    While photos are being taken all streams are paused, and while photos are being saved
+      they run at DOWNLOAD_PREVIEW_RATE (see setCaptureInProgress), so the previews do not
+      compete with the captures and downloads for the links to the cameras.
+    """
+
+    def __init__(self):
+        super(previewRegistry, self).__init__()
+        self.log = logging.getLogger("UThread")
+        self.streams = {}  # (camera name, stream type) -> previewStream
+        self.disabled_cameras = set()  # cameras turned off in the current camera setting
+        self.capturing = False  # photos are being taken
+        self.rig_rate_scale = 1.0  # rate of all streams, lowered while photos are being saved
+
+    def registerSource(self, camera_name, stream_type, factory):
+        """registerSource
+        Register how to acquire a stream. Nothing is started until someone subscribes.
+
+        Args:
+            camera_name (str): name of the camera, ie 'pieye-ant.local' or 'Top'
+            stream_type (str): ie 'quick', 'full' or 'liveview'
+            factory (callable): returns a new source for the stream, ie a workerSource
+        """
+        key = (camera_name, stream_type)
+        if key not in self.streams:
+            self.streams[key] = previewStream(factory)
+            if self.capturing:
+                self.streams[key].pause_reasons.add("capture")
+
+    def subscribe(self, camera_name, stream_type, callback, widget=None):
+        """subscribe
+        Start receiving the frames of a stream. Frames are QImages, or None if the frame could not be fetched.
+
+        Args:
+            camera_name (str): name of the camera
+            stream_type (str): type of the stream
+            callback (callable): called with each frame, in the GUI thread
+            widget (QWidget, optional): the widget showing the frames, used to pause the stream
+              while it is not visible. Defaults to None, which counts as always visible.
+
+        Returns:
+            subscription: pass this to unsubscribe
+        """
+        key = (camera_name, stream_type)
+        stream = self.streams[key]
+        stream.subscribers.append(callback)
+        stream.widgets[callback] = widget
+        if widget is not None:
+            widget.installEventFilter(self)
+            widget.window().installEventFilter(self)
+        if stream.source is None and camera_name not in self.disabled_cameras:
+            self._startStream(key)
+        self._updateVisibility(key)
+        return (key, callback)
+
+    def unsubscribe(self, subscription):
+        """unsubscribe
+        Stop receiving frames. The stream is stopped if this was the last subscriber.
+        """
+        key, callback = subscription
+        stream = self.streams[key]
+        if callback in stream.subscribers:
+            stream.subscribers.remove(callback)
+        widget = stream.widgets.pop(callback, None)
+        if widget is not None:
+            self._releaseWidget(widget)
+        if not stream.subscribers and stream.source is not None:
+            self._stopStream(key)
+        self._updateVisibility(key)
+
+    def _releaseWidget(self, widget):
+        # stop watching a widget that is no longer subscribed, and its window if no other subscribed widget is in it
+        if sip.isdeleted(widget):
+            return
+        widgets = [
+            other
+            for stream in self.streams.values()
+            for other in stream.widgets.values()
+            if other is not None and not sip.isdeleted(other)
+        ]
+        if widget not in widgets:
+            widget.removeEventFilter(self)
+        window = widget.window()
+        if all(other.window() is not window for other in widgets):
+            window.removeEventFilter(self)
+
+    def setCameraEnabled(self, camera_name, enabled):
+        """setCameraEnabled
+        Stop all the streams of a camera that is turned off, and restart them when it is turned back on.
+
+        Args:
+            camera_name (str): name of the camera, ie 'pieye-ant.local' or 'Top'
+            enabled (bool): whether the camera is used in the current camera setting
+        """
+        if enabled == (camera_name not in self.disabled_cameras):
+            return
+        self.log.info(f"{'Enabling' if enabled else 'Disabling'} previews of {camera_name}")
+        if enabled:
+            self.disabled_cameras.discard(camera_name)
+        else:
+            self.disabled_cameras.add(camera_name)
+
+        for key, stream in self.streams.items():
+            if key[0] != camera_name:
+                continue
+            if not enabled and stream.source is not None:
+                self._stopStream(key)
+                # show the x, so the last frame is not mistaken for a live one
+                for callback in list(stream.subscribers):
+                    callback(None)
+            elif enabled and stream.source is None and stream.subscribers:
+                self._startStream(key)
+
+    def applyCameraSetting(self, setting):
+        """applyCameraSetting
+        Args:
+            setting (dict): camera name -> True if the camera is used, as in camera_settings.json
+        """
+        for camera_name, enabled in setting.items():
+            self.setCameraEnabled(camera_name, enabled)
+
+    def setCaptureInProgress(self, capturing, downloading):
+        """setCaptureInProgress
+        Throttle all the previews while photos are being taken or saved.
+
+        Args:
+            capturing (bool): photos are being taken, all streams are paused
+            downloading (bool): photos are being saved, all streams run at DOWNLOAD_PREVIEW_RATE
+        """
+        rig_rate_scale = DOWNLOAD_PREVIEW_RATE if downloading else 1.0
+        if capturing == self.capturing and rig_rate_scale == self.rig_rate_scale:
+            return
+        if capturing:
+            self.log.info("Pausing previews while taking photos")
+        elif downloading:
+            self.log.info("Slowing down previews while saving photos")
+        else:
+            self.log.info("Resuming previews, all photos are saved")
+        self.capturing = capturing
+        self.rig_rate_scale = rig_rate_scale
+        for key in self.streams:
+            self.setPauseReason(key[0], key[1], "capture", capturing)
+            self._applyRateScale(key)
+
+    def setPauseReason(self, camera_name, stream_type, reason, paused):
+        """setPauseReason
+        Add or remove a reason for pausing a stream. The stream's loop is paused as long as there is any reason.
+
+        Args:
+            camera_name (str): name of the camera
+            stream_type (str): type of the stream
+            reason (str): why the stream is paused, ie 'hidden' or 'capture'
+            paused (bool): True to add the reason, False to remove it
+        """
+        stream = self.streams.get((camera_name, stream_type))
+        if stream is None:
+            return
+        was_paused = bool(stream.pause_reasons)
+        if paused:
+            stream.pause_reasons.add(reason)
+        else:
+            stream.pause_reasons.discard(reason)
+        is_paused = bool(stream.pause_reasons)
+        if stream.source is not None and is_paused != was_paused:
+            stream.source.setPaused(is_paused)
+
+    def eventFilter(self, obj, event):
+        """eventFilter
+        Watches the subscribed widgets and their windows for being shown, hidden, minimized or (de)activated.
+        """
+        if sip.isdeleted(obj):
+            return False
+        if event.type() in (
+            QEvent.Show,
+            QEvent.Hide,
+            QEvent.WindowStateChange,
+            QEvent.ActivationChange,
+        ):
+            if event.type() == QEvent.Show and obj.isWidgetType():
+                # the widget may have been added to a window since it subscribed
+                obj.window().installEventFilter(self)
+            for key in self.streams:
+                self._updateVisibility(key)
+        return False
+
+    def _updateVisibility(self, key):
+        stream = self.streams[key]
+        if not stream.subscribers:
+            return
+        widgets = list(stream.widgets.values())
+        visible = any(self._isShown(widget) for widget in widgets)
+        active = any(self._isActive(widget) for widget in widgets)
+        self.setPauseReason(key[0], key[1], "hidden", not visible)
+        stream.active = active
+        self._applyRateScale(key)
+
+    def _applyRateScale(self, key):
+        stream = self.streams[key]
+        rate_scale = (1.0 if stream.active else PREVIEW_INACTIVE_RATE) * self.rig_rate_scale
+        if rate_scale != stream.rate_scale:
+            stream.rate_scale = rate_scale
+            if stream.source is not None:
+                stream.source.setRateScale(rate_scale)
+
+    @staticmethod
+    def _isShown(widget):
+        if widget is None:
+            return True
+        if sip.isdeleted(widget):
+            # destroyed without unsubscribing
+            return False
+        return widget.isVisible() and not widget.window().isMinimized()
+
+    @staticmethod
+    def _isActive(widget):
+        if widget is None:
+            return True
+        if sip.isdeleted(widget):
+            return False
+        return widget.window().isActiveWindow()
+
+    def _startStream(self, key):
+        stream = self.streams[key]
+        self.log.info(f"Starting {key[1]} preview of {key[0]}")
+        stream.source = stream.factory()
+        stream.mailbox = stream.source.start()
+        stream.mailbox.result.connect(partial(self._deliver, key))
+        if stream.pause_reasons:
+            stream.source.setPaused(True)
+        if stream.rate_scale != 1.0:
+            stream.source.setRateScale(stream.rate_scale)
+
+    def _stopStream(self, key):
+        stream = self.streams[key]
+        self.log.info(f"Stopping {key[1]} preview of {key[0]}")
+        stream.mailbox.result.disconnect()
+        stream.source.stop()
+        stream.source = None
+        stream.mailbox = None
+
+    def _deliver(self, key, frame):
+        # runs in the GUI thread, fans the frame out to all the subscribers
+        stream = self.streams[key]
+        for callback in list(stream.subscribers):
+            callback(frame)
+
+
+_registry = None
+
+
+def get_preview_registry():
+    """get_preview_registry
+    Returns the preview registry shared by the whole application. Must be called from the GUI thread.
+    """
+    global _registry
+    if _registry is None:
+        _registry = previewRegistry()
+    return _registry
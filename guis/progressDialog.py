@@ -39,8 +39,6 @@ class progressDialog(basicGUI, QtWidgets.QMainWindow):
 
         self.progressBar.setValue(value)
 
-        QtWidgets.QApplication.processEvents()
-
     def _close(self):
         self.update(100)
         self.progressBar.close()
@@ -1,2 +1,108 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
 STORAGE_PATH = "/Users/dassco/Desktop/Image Storage"
 DEBUG = False
+
+# Timeouts (in seconds) for http requests to the pi-eyes. The connect timeout is how long to wait
+#   for the connection to open, the read timeout how long to wait for the pi-eye to send data.
+HTTP_CONNECT_TIMEOUT = 3
+HTTP_READ_TIMEOUT = 10
+
+# Number of keep-alive connections kept open to each pi-eye
+HTTP_POOL_SIZE = 4
+
+# Resolved addresses of the pi-eye hostnames (ie pieye-ant.local) are cached. After this many
+#   seconds the address is refreshed in the background, while the cached address keeps being used.
+HOST_CACHE_TTL = 300
+
+# After this many failed requests in a row a pi-eye is considered offline. It is then only
+#   re-checked with a quick connection probe, with a backoff that doubles up to the maximum (in seconds).
+OFFLINE_FAILURE_THRESHOLD = 3
+OFFLINE_MIN_BACKOFF = 1
+OFFLINE_MAX_BACKOFF = 30
+PROBE_TIMEOUT = 0.5
+
+# Number of threads for each kind of work. The preview threads run the canon live views and the
+#   pi-eye focus windows, the capture threads tell the cameras to take photos, the download threads save them.
+THREAD_POOL_SIZES = {"preview": 8, "capture": 8, "download": 4}
+
+# Target frame rates of the live previews, per type of camera. The preview loops slow down
+#   below this if fetching a frame takes longer, or if the GUI has not drawn the last frame yet.
+PREVIEW_TARGET_FPS = {"canon": 15, "pieye": 10, "pieye_full": 1}
+
+# Fraction of the target frame rate the previews run at while their window is not the active window
+PREVIEW_INACTIVE_RATE = 0.2
+
+# All previews are paused while photos are being taken, so they do not compete with the captures
+#   for the usb(-ethernet) links. While photos are only being saved they run at this fraction of the target frame rate.
+DOWNLOAD_PREVIEW_RATE = 0.2
+
+# The canons capture in RAW (CR3). If True, the image format is switched to RAW just for each capture
+#   and back to JPEG after it, for cameras that cannot show a live view while set to RAW. The EOS R5
+#   live view does not depend on the image format, so it stays on RAW for the whole session instead.
+CANON_SWITCH_IMAGE_FORMAT = False
+
+# If True, the canons keep each capture in their internal RAM instead of writing it to the memory card.
+#   The file is deleted from the camera once it has been downloaded and checked.
+CANON_CAPTURE_TO_RAM = True
+
+# Size (in bytes) of the chunks the canon photos are downloaded in. This is all that is held in memory.
+CANON_DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Times a canon photo is downloaded before giving up. A photo that could not be downloaded is
+#   kept on the camera, it is only deleted from the camera's RAM once it is saved.
+CANON_DOWNLOAD_ATTEMPTS = 2
+
+# Size (in bytes) of the chunks the pi-eye photos are streamed to disk in
+PIEYE_DOWNLOAD_CHUNK_SIZE = 256 * 1024
+
+# Seconds each camera gets to take a photo, and to save it. A camera that has not finished by then counts as failed.
+CAPTURE_DEADLINE = 30
+SAVE_DEADLINE = 120
+
+# Number of specimens whose photos can be saving in the background while the next specimen is
+#   photographed. Taking photos is blocked while this many are still saving. 1 turns off pipelining.
+MAX_SPECIMENS_IN_FLIGHT = 2
+
+# The link (usb bus, hub or usb-ethernet gadget) each camera downloads its photos over. Cameras
+#   that are not listed get a link of their own. Change this to match how the rig is cabled.
+CAMERA_LINKS = {
+    "Top": "canon-usb",
+    "Side": "canon-usb",
+    "pieye-ant.local": "pieye-hub",
+    "pieye-beetle.local": "pieye-hub",
+    "pieye-cicada.local": "pieye-hub",
+    "pieye-dragonfly.local": "pieye-hub",
+    "pieye-earwig.local": "pieye-hub",
+}
+
+# Number of downloads each link runs at once, the rest wait. The throughput of each link is
+#   logged after every specimen, to tune these.
+LINK_MAX_TRANSFERS = {"canon-usb": 1, "pieye-hub": 2}
+DEFAULT_LINK_MAX_TRANSFERS = 1
+
+# Model of the canon cameras, as reported by gphoto2
+CANON_MODEL = "Canon EOS R5"
+
+# File the port and serial number each canon was last found on are kept in ('Top' -> port), so
+#   reconnecting goes straight to the right port instead of opening every camera to find it.
+CANON_PORT_CACHE = "canon_ports.json"
+
+# Startup import budget, checked by running startup.py. The imports of main.py should take less than
+#   this many milliseconds, and none of the LAZY_MODULES should be imported at startup (they are
+#   imported where they are used instead).
+STARTUP_IMPORT_BUDGET_MS = 1500
+LAZY_MODULES = ["pandas", "cv2", "imageio", "paramiko", "aiohttp"]
+
+# Seconds each kind of canon command may run before the camera is considered hung. A download
+#   command reads one chunk (CANON_DOWNLOAD_CHUNK_SIZE), a config command may include finding the camera.
+CANON_COMMAND_DEADLINES = {"capture": 20, "download": 10, "config": 30, "preview": 5}
+
+# A canon that hangs, fails this many commands in a row, or cannot be found, is reconnected
+#   automatically. Failed reconnects are retried with a backoff that doubles up to the maximum (in seconds).
+CANON_FAILURE_THRESHOLD = 3
+CANON_RECONNECT_MIN_BACKOFF = 1
+CANON_RECONNECT_MAX_BACKOFF = 60
+
+# Seconds between the checks of the canons for hung commands
+CANON_WATCHDOG_INTERVAL = 1
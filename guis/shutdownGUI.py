@@ -3,7 +3,6 @@ from PyQt5 import QtWidgets
 from PyQt5.QtWidgets import QMessageBox 
 import os
 import signal
-import paramiko
 
 class ShutdownPiGUI(basicGUI):
     """
@@ -48,7 +47,9 @@ class ShutdownPiGUI(basicGUI):
         # Loop through the hostnames and shut down each Raspberry Pi        
 
         if button.text() == "&Yes":
-            
+            # only needed here, so it is not loaded at startup
+            import paramiko
+
             for hostname in PI_HOSTNAMES:
                 try:
                     # Create an SSH client instance
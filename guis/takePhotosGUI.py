@@ -1,25 +1,37 @@
 import sys
+import logging
 import traceback
-import numpy as np
-import pandas as pd
 
-from time import sleep
 from pathlib import Path
-from datetime import datetime
+from functools import partial
+from datetime import datetime, timezone
 from PyQt5 import QtWidgets
-from PyQt5.QtWidgets import *
 from PyQt5.QtMultimedia import QSound
-from PyQt5.QtCore import QRunnable, pyqtSlot, QThreadPool
+from PyQt5.QtCore import QRunnable, pyqtSlot, pyqtSignal, QTimer, QObject
 
 from guis.cameraSetupGUI import JsonCameraSetting
 from guis.basicGUI import basicGUI
+from network import get_host_resolver
 from guis.workers import WorkerSignals
 from guis.progressDialog import progressDialog
+from guis.threadPools import get_thread_pool, log_pool_stats
+from guis.downloadScheduler import get_download_scheduler
+from guis.previewRegistry import get_preview_registry
+from guis.settings.settings import CAPTURE_DEADLINE, SAVE_DEADLINE, MAX_SPECIMENS_IN_FLIGHT
 
 
 class takePhotosGUI(basicGUI):
     """takePhotosGUI
     GUI that controls taking photos and saving them
+
+    Taking and saving photos is driven by the signals of the workers, so the GUI thread
+      never waits for the cameras. Each stage is a cameraJob: one for taking the photos of
+      a specimen, then one for saving them into the specimen's folder.
+
+    Saving is pipelined: as soon as all the cameras have taken their photo, the next
+      specimen can be photographed while the photos of the previous one are still being
+      saved. At most MAX_SPECIMENS_IN_FLIGHT specimens are saved at once, the button is
+      disabled until one of them is done.
     """
 
     def __init__(self, storage_path, **kwargs):
@@ -41,48 +53,56 @@ class takePhotosGUI(basicGUI):
         self.take_photos_timings = []
         self.save_photos_timings = []
 
+        # the job taking the photos of the current specimen, None when no photos are being taken
+        self.capture = None
+
+        # the jobs saving the photos of the previous specimens
+        self.saving = []
+
     def initUI(self):
         self.takePhotosButton = QtWidgets.QPushButton(" Take Photo(s) ")
         self.takePhotosButton.clicked.connect(self.takePhotos)
         self.takePhotosButton.setStyleSheet("background-color: #caffbf;")
         self.takePhotosButton.setFixedSize(90, 30)
+
+        self.savingLabel = QtWidgets.QLabel("")
                 
         self.grid.addWidget(self.takePhotosButton, 0, 0, 10, 10)
+        self.grid.addWidget(self.savingLabel, 10, 0, 1, 10)
         
         self.setLayout(self.grid)
 
-    @property
-    def all_finished(self):
-        """all_finished
-
-        Returns: True if all the cameras have finished taking photos (even if they failed)
-          False otherwise.
+    def updateButton(self):
+        """updateButton
+        Only allow taking photos when no photos are being taken, and there is room for one more specimen to be saved.
+        Also throttles the previews while photos are being taken or saved.
         """
-        finished = np.array(list(self.finished.values()))
-        return finished.all()
-
-    def setStatusFinished(self, camera_and_result):
-        """setStatusFinished
-        Once the camera has finished taking the photo, save the result (None if there was an error)
-          and set the status to finished = True for that camera.
-
-        Args:
-            camera_and_result (list): list with two entries: the cameraGUI object and the result
-              from the takePhoto function.
-        """
-        camera, result = camera_and_result
-        name = str(camera.camera_name)
-        self.log.info("setting status finished " + name)
-        self.results[camera.camera_name] = result
-        self.finished[camera.camera_name] = True
-        self.timing[camera.camera_name] = pd.Timestamp.now() - self.start_time
+        self.takePhotosButton.setEnabled(
+            self.capture is None and len(self.saving) < MAX_SPECIMENS_IN_FLIGHT
+        )
+        self.savingLabel.setText(
+            f"Saving {len(self.saving)} specimen(s)" if self.saving else ""
+        )
+
+        # keep the previews off the links to the cameras from trigger until the last photo is saved
+        get_preview_registry().setCaptureInProgress(
+            capturing=self.capture is not None, downloading=bool(self.saving)
+        )
 
     def takePhotos(self):
         """takePhotos
-        Tell chosen cameras to take a photo, and wait for all the responses
+        Tell chosen cameras to take a photo. Returns straight away, finishTaking is called once all cameras are done.
         """
+        if self.capture is not None:
+            self.log.info("Still taking photos, ignoring command to take photos")
+            return
+        if len(self.saving) >= MAX_SPECIMENS_IN_FLIGHT:
+            self.log.info(
+                f"Still saving {len(self.saving)} specimens, ignoring command to take photos"
+            )
+            return
+
         self.log.info("Got Command to Take Photos")
-        self.start_time = pd.Timestamp.now()
         # open progress dialog
         self.progress = progressDialog()
         self.progress._open()
@@ -108,144 +128,301 @@ class takePhotosGUI(basicGUI):
         for camera in camerasToRemove:
             self.cameras.remove(camera)
 
-        # dictionaries to store all results and status
-        self.results = {}
-        self.finished = {}
-        self.timing = {}
+        self.capture = cameraJob(
+            self.cameras,
+            takeSinglePhotoWorker,
+            CAPTURE_DEADLINE,
+            get_thread_pool("capture"),
+            parent=self,
+        )
+        self.capture.progressed.connect(self.updateProgress)
+        self.capture.done.connect(self.finishTaking)
+        self.capture.late.connect(self.discardLatePhoto)
 
         for camera in self.cameras:
-            # initialize the camera as not finished
-            self.finished[camera.camera_name] = False
-
-            # create a worker to take a single photo from the camera
-            worker = takeSinglePhotoWorker(camera)
-
-            # when the worker is done, have it set its status to finished
-            worker.signals.result.connect(self.setStatusFinished)
-
-            # start the thread
-            self.threadpool.start(worker)
-
-        for i in range(5000):  # prevent infinite loop
-            sleep(0.02)
-            # get the number of cameras that have finished
-            n_finished = sum(self.finished.values())
-
-            # get the number of cameras that failed to return images
-            n_failed = sum([x == None for x in self.results.values()])
-
-            # calculate the percentage of cameras finished taking photos
-            progress = int(100 * n_finished / len(self.finished))
-
-            # update the progress bar
-            self.progress.update(
-                progress,
-                f"{n_finished} / {len(self.finished)} photos taken, {n_failed} Failed",
-            )
-
-            # if all finished, close the loop
-            if self.all_finished:
-                break
+            # do not wait for the timeout on canons that are known to be offline, count them as failed straight away.
+            #   the pi-eyes are always asked, try_url fails fast while they are offline, and checks if they are back
+            if camera in canons and camera.is_offline:
+                self.log.warning(f"{camera.camera_name} is offline, not asking it to take a photo")
+                self.capture.setStatusFinished([camera, None])
+
+        self.updateButton()
+        self.capture.start()
+
+    def updateProgress(self, job):
+        """updateProgress
+        Show how many cameras have taken their photo
+        """
+        self.progress.update(
+            int(100 * job.n_finished / max(1, len(job.finished))),
+            f"{job.n_finished} / {len(job.finished)} photos taken, {job.n_failed} Failed",
+        )
+
+    def finishTaking(self, job):
+        """finishTaking
+        All the cameras have taken their photo (or failed to), save the photos if they all succeeded
+        """
+        self.capture = None
 
-        # get the number of cameras that failed to return images
-        n_failed = sum([x == None for x in self.results.values()])
+        # close the progress window
+        self.progress._close()
 
         # if all the images finished, save the photos
-        if n_failed == 0:
-            end_time = pd.Timestamp.now()
-            self.timing['total'] = end_time - self.start_time
-            self.take_photos_timings += [self.timing]
-            pd.DataFrame(self.take_photos_timings).to_csv('take_photo_timings.csv')
+        if job.n_failed == 0:
+            job.timing['total'] = datetime.now() - job.start_time
+            self.take_photos_timings += [job.timing]
+            write_timings(self.take_photos_timings, 'take_photo_timings.csv')
             self.sounds["Success"].play()
-            self.progress.update(
-                100,
-                f"All photos successfully taken.. Saving photos",
-            )
-            self.savePhotos(self.results)
+            self.savePhotos(job.results)
         else:
+            # the photos of the cameras that did not fail are not saved, do not leave them behind
+            self.discardPhotos(job.results)
+            self.updateButton()
             # play 'Failure' sound
             self.sounds["Failure"].play()
             # get names of cameras that failed
-            failed_names = [k for k, v in self.results.items() if v == None]
             self.warn(
-                f"Warning! The following cameras failed to take photos: {failed_names}, files not saved"
+                f"Warning! The following cameras failed to take photos: {job.failed_names}, files not saved"
             )
-        
-        # close the progress window
-        self.progress._close()
+
+    def discardPhotos(self, filenames):
+        """discardPhotos
+        Delete the photos of a specimen that is not saved, from the cameras and the staging folder.
+        Runs in the download threadpool, so the GUI does not wait for the cameras.
+
+        Args:
+            filenames (dict): camera name -> file name of the image on the camera, or None if it failed
+        """
+        for camera in self.cameras:
+            filename = filenames.get(camera.camera_name, None)
+            if filename is not None:
+                get_thread_pool("download").start(discardPhotoWorker(camera, filename))
+
+    def discardLatePhoto(self, camera, filename):
+        """discardLatePhoto
+        A camera took its photo after its deadline, so the specimen was already failed. Delete the photo.
+        """
+        if filename is not None:
+            get_thread_pool("download").start(discardPhotoWorker(camera, filename))
 
     def savePhotos(self, filenames):
         """savePhotos
-        Given a dictionary of filenames for the cameras, save those files locally
+        Given a dictionary of filenames for the cameras, save those files locally, in a new folder
+        for the specimen. Returns straight away, finishSaving is called once all cameras are done.
 
         Args:
             filenames (dict): dictionary where the keys are the camera names, and the values are the file names
               of the images on the cameras themselves
         """
-        self.start_time = pd.Timestamp.now()
         # folder name is just a unique identifier with the current timestamp
-        folder_name = str(pd.Timestamp.now("UTC"))
+        folder_name = str(datetime.now(timezone.utc))
         folder_path = self.storage_path / folder_name
 
         # create the new folder
         folder_path.mkdir(parents=True, exist_ok=False)
 
-        # dictionaries to store status
-        self.finished = {}
+        cameras = [
+            camera for camera in self.cameras if filenames.get(camera.camera_name, None) is not None
+        ]
+
+        # create a worker to save a single photo from each camera
+        job = cameraJob(
+            cameras,
+            lambda camera: saveSinglePhotoWorker(
+                camera, filenames[camera.camera_name], folder_path
+            ),
+            SAVE_DEADLINE,
+            get_thread_pool("download"),
+            parent=self,
+        )
+        job.folder_path = folder_path
+        job.done.connect(self.finishSaving)
+        self.saving.append(job)
+        self.updateButton()
+        job.start()
+
+    def finishSaving(self, job):
+        """finishSaving
+        All the cameras have saved the photo of a specimen (or failed to), check the folder
+        """
+        self.saving.remove(job)
+        self.updateButton()
+        folder_path = job.folder_path
+
+        self.log.info("Finished Saving photos in " + str(folder_path))
+
+        job.timing['total'] = datetime.now() - job.start_time
+        self.save_photos_timings += [job.timing]
+        write_timings(self.save_photos_timings, 'save_photo_timings.csv')
+        log_pool_stats()
+        get_download_scheduler().logStats()
+        get_host_resolver().logStats()
+
+        # check that all photos were actually saved
+        n_saved = len([x for x in folder_path.glob('*') if x.is_file()])
+
+        if job.n_failed:
+            self.sounds["Failure"].play()
+            self.warn(
+                f"Warning! The following cameras failed to save photos: {job.failed_names}, please check the save folder {folder_path}"
+            )
+        elif n_saved != len(job.cameras):
+            self.warn('Something went wrong saving the files. Please check the save folder' + str(folder_path) + ', and/or contact support')
+
+
+class cameraJob(QObject):
+    """cameraJob
+    Runs a worker for each camera (ie to take or save a photo) and collects the results.
+
+    Each worker reports back to workerDone, and done is emitted as soon as the last
+      camera has finished. Every camera has a deadline, a camera that has not finished by
+      then counts as failed, and if its result still comes in later it is passed to late instead.
+      The job deletes itself once all its workers have reported back.
+
+    Args:
+        cameras (list): the cameraGUI objects
+        make_worker (callable): makes the worker for a camera
+        deadline (float): seconds each camera gets to finish
+        threadpool (workerPool): the threadpool to run the workers in
+        parent (QObject, optional): keeps the job alive until all its workers have reported back
+    """
+
+    progressed = pyqtSignal(object)  # the job, every time a camera finishes
+    done = pyqtSignal(object)  # the job, once all cameras have finished
+    late = pyqtSignal(object, object)  # the camera and its result, if it comes in after the deadline
+
+    def __init__(self, cameras, make_worker, deadline, threadpool, parent=None):
+        super(cameraJob, self).__init__(parent)
+        self.log = logging.getLogger("UThread")
+        self.cameras = cameras
+        self.make_worker = make_worker
+        self.deadline = deadline
+        self.threadpool = threadpool
+        self.started = False
+        self.running = 0  # workers that have not reported back yet
+
+        # dictionaries to store all results and status
+        self.results = {}
+        self.finished = {camera.camera_name: False for camera in cameras}
         self.timing = {}
+        self.start_time = datetime.now()
 
-        for camera in self.cameras:
+        # camera name -> deadline timer
+        self.deadlines = {}
 
-            if filenames.get(camera.camera_name, None) is not None:
-                # initialize the camera as not finished
-                self.finished[camera.camera_name] = False
+    @property
+    def all_finished(self):
+        """all_finished
 
-                # create a worker to take a single photo from the camera
-                worker = saveSinglePhotoWorker(camera, filenames[camera.camera_name], folder_path)
+        Returns: True if all the cameras have finished (even if they failed)
+          False otherwise.
+        """
+        return all(self.finished.values())
 
-                # when the worker is done, have it set its status to finished
-                worker.signals.result.connect(self.setStatusFinished)
+    @property
+    def n_finished(self):
+        return sum(self.finished.values())
 
-                # start the thread
-                self.threadpool.start(worker)
+    @property
+    def failed_names(self):
+        """failed_names
+        Returns: names of the cameras that failed
+        """
+        return [k for k, v in self.results.items() if v == None]
 
-        for i in range(5000):  # prevent infinite loop
-            sleep(0.02)
-            # get the number of cameras that have finished
-            n_finished = sum(self.finished.values())
+    @property
+    def n_failed(self):
+        return len(self.failed_names)
 
-            # get the number of cameras that failed to return images
-            n_failed = sum([x == None for x in self.results.values()])
+    def start(self):
+        """start
+        Run a worker for each camera that is not finished yet, each with a deadline
+        """
+        self.started = True
+        for camera in self.cameras:
+            if self.finished[camera.camera_name]:
+                continue
 
-            # calculate the percentage of cameras finished taking photos
-            progress = int(100 * n_finished / len(self.finished))
+            # create a worker for the camera
+            worker = self.make_worker(camera)
 
-            # update the progress bar
-            self.progress.update(
-                progress,
-                f"{n_finished} / {len(self.finished)} photos saved, {n_failed} Failed",
-            )
+            # when the worker is done, have it set its status to finished
+            worker.signals.result.connect(self.workerDone)
+            self.running += 1
 
-            # if all finished, close the loop
-            if self.all_finished:
-                break
+            # if it is not done in time, count it as failed
+            timer = QTimer(self)
+            timer.setSingleShot(True)
+            timer.timeout.connect(partial(self.deadlinePassed, camera))
+            timer.start(int(1000 * self.deadline))
+            self.deadlines[camera.camera_name] = timer
 
-        # get the number of cameras that failed to return images
-        n_failed = sum([x == None for x in self.results.values()])
+            # start the thread
+            self.threadpool.start(worker)
 
-        self.log.info("Finished Saving photos in " + str(folder_path))
+        # in case there was nothing to wait for, ie all the cameras were offline
+        self.checkDone()
+        if self.running == 0:
+            self.deleteLater()
 
-        # check that all photos were actually saved
-        n_saved = len([x for x in folder_path.glob('*') if x.is_file()])
+    def workerDone(self, camera_and_result):
+        """workerDone
+        A worker has reported back. Its result is passed to late if the camera's deadline has already passed.
 
-        if n_saved != len(self.cameras):
-            self.warn('Something went wrong saving the files. Please check the save folder' + str(folder_path) + ', and/or contact support')
+        Args:
+            camera_and_result (list): list with two entries: the cameraGUI object and the result
+              from the worker
+        """
+        camera, result = camera_and_result
+        self.running -= 1
+        if self.finished.get(camera.camera_name, True):
+            self.log.info(f"Late result from {camera.camera_name}")
+            self.late.emit(camera, result)
+        else:
+            self.setStatusFinished(camera_and_result)
+        if self.running == 0:
+            self.deleteLater()
 
-        
-        end_time = pd.Timestamp.now()
-        self.timing['total'] = end_time - self.start_time
-        self.save_photos_timings += [self.timing]
-        pd.DataFrame(self.save_photos_timings).to_csv('save_photo_timings.csv')
+    def setStatusFinished(self, camera_and_result):
+        """setStatusFinished
+        Once the camera has finished, save the result (None if there was an error)
+          and set the status to finished = True for that camera.
+
+        Args:
+            camera_and_result (list): list with two entries: the cameraGUI object and the result
+              from the worker
+        """
+        camera, result = camera_and_result
+        name = str(camera.camera_name)
+        if self.finished.get(name, True):
+            return
+        self.log.info("setting status finished " + name)
+        self.results[camera.camera_name] = result
+        self.finished[camera.camera_name] = True
+        self.timing[camera.camera_name] = datetime.now() - self.start_time
+
+        deadline = self.deadlines.pop(name, None)
+        if deadline is not None:
+            deadline.stop()
+            deadline.deleteLater()
+
+        self.progressed.emit(self)
+        self.checkDone()
+
+    def deadlinePassed(self, camera):
+        """deadlinePassed
+        A camera did not finish in time, count it as failed
+        """
+        if self.finished.get(camera.camera_name, True):
+            return
+        self.log.warning(f"{camera.camera_name} did not finish in time")
+        self.setStatusFinished([camera, None])
+
+    def checkDone(self):
+        if self.started and self.all_finished:
+            # only emit once
+            self.started = False
+            self.done.emit(self)
 
 
 class takeSinglePhotoWorker(QRunnable):
@@ -315,3 +492,35 @@ class saveSinglePhotoWorker(QRunnable):
             out = [self.camera, result]
             self.signals.result.emit(out)
             self.signals.finished.emit()  # Done
+
+
+class discardPhotoWorker(QRunnable):
+    """
+    Worker thread for telling a single camera to delete a photo that will not be saved.
+    """
+
+    def __init__(self, camera, camera_path):
+        super(discardPhotoWorker, self).__init__()
+        self.camera = camera
+        self.camera_path = camera_path
+
+    @pyqtSlot()
+    def run(self):
+        try:
+            self.camera.discardPhoto(self.camera_path)
+        except:
+            traceback.print_exc()
+
+
+def write_timings(timings, path):
+    """write_timings
+    Write the timings of all the specimens so far to a csv file
+
+    Args:
+        timings (list): one dictionary per specimen, camera name (and 'total') -> timedelta
+        path (str): path of the csv file
+    """
+    # pandas takes a while to import, so it is only loaded once the first timings are written
+    import pandas as pd
+
+    pd.DataFrame(timings).to_csv(path)
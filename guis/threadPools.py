@@ -0,0 +1,140 @@
+import time
+import logging
+import threading
+from collections import deque
+
+from PyQt5.QtCore import QRunnable, QThread, QThreadPool
+
+from guis.settings.settings import THREAD_POOL_SIZES
+
+
+class pooledRunnable(QRunnable):
+    """
+    Wraps a worker so the workerPool knows when it starts, and runs it at the pool's thread priority
+    """
+
+    def __init__(self, pool, worker):
+        super(pooledRunnable, self).__init__()
+        self.pool = pool
+        self.worker = worker
+        self.submitted_at = time.monotonic()
+
+    def run(self):
+        QThread.currentThread().setPriority(self.pool.thread_priority)
+        self.pool.workerStarted(time.monotonic() - self.submitted_at)
+        try:
+            self.worker.run()
+        finally:
+            self.pool.workerFinished()
+
+
+class workerPool:
+    """
+    A threadpool for one kind of work: live previews, capture triggering or downloads.
+
+    Each kind of work has its own pool with its own threads, so the preview workers (which
+      never finish) cannot keep the capture workers waiting for a thread. The threads of
+      each pool run at their own priority, so capture triggering comes first.
+
+    Keeps track of how long workers wait for a thread, and how busy the pool is, see stats.
+    """
+
+    def __init__(self, name, max_threads, thread_priority=QThread.InheritPriority):
+        self.log = logging.getLogger("UThread")
+        self.name = name
+        self.thread_priority = thread_priority
+        self.pool = QThreadPool()
+        self.pool.setMaxThreadCount(max_threads)
+
+        self.lock = threading.Lock()
+        self.queued = 0  # workers waiting for a thread
+        self.running = 0  # workers running
+        self.peak_running = 0  # most workers that ran at once
+        self.waits = deque(maxlen=1000)  # seconds recent workers waited for a thread
+
+    def start(self, worker, priority=0):
+        """start
+        Run a worker in the pool. Workers with a higher priority get a thread first.
+
+        Args:
+            worker (QRunnable): the worker to run
+            priority (int, optional): priority in the pool's queue. Defaults to 0.
+        """
+        with self.lock:
+            self.queued += 1
+        self.pool.start(pooledRunnable(self, worker), priority)
+
+    def workerStarted(self, wait):
+        with self.lock:
+            self.queued -= 1
+            self.running += 1
+            self.peak_running = max(self.peak_running, self.running)
+            self.waits.append(wait)
+        if wait > 0.1:
+            self.log.debug(f"Worker waited {1000 * wait:.0f} ms for a thread in the {self.name} pool")
+
+    def workerFinished(self):
+        with self.lock:
+            self.running -= 1
+
+    def stats(self):
+        """stats
+        Returns:
+            stats (dict): workers running and waiting, the maximum number of threads, the saturation
+              (running / maximum threads) now and at its peak, and the average and maximum time (in ms)
+              recent workers waited for a thread
+        """
+        with self.lock:
+            waits = list(self.waits)
+            running, queued, peak_running = self.running, self.queued, self.peak_running
+        max_threads = self.pool.maxThreadCount()
+        return {
+            "running": running,
+            "queued": queued,
+            "max_threads": max_threads,
+            "saturation": running / max_threads,
+            "peak_saturation": peak_running / max_threads,
+            "average_wait_ms": 1000 * sum(waits) / len(waits) if waits else 0.0,
+            "max_wait_ms": 1000 * max(waits) if waits else 0.0,
+        }
+
+
+# name -> thread priority of the pool
+POOL_PRIORITIES = {
+    "capture": QThread.HighestPriority,
+    "download": QThread.NormalPriority,
+    "preview": QThread.LowPriority,
+}
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_thread_pool(name):
+    """get_thread_pool
+    Returns the pool for one kind of work, shared by the whole application
+
+    Args:
+        name (str): 'capture', 'download' or 'preview'
+    """
+    with _pools_lock:
+        if name not in _pools:
+            _pools[name] = workerPool(name, THREAD_POOL_SIZES[name], POOL_PRIORITIES[name])
+        return _pools[name]
+
+
+def log_pool_stats():
+    """log_pool_stats
+    Log how busy each pool is, and how long workers waited for a thread
+    """
+    log = logging.getLogger("UThread")
+    with _pools_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        stats = pool.stats()
+        log.info(
+            f"{pool.name} pool: {stats['running']}/{stats['max_threads']} threads busy, "
+            f"{100 * stats['saturation']:.0f}% saturated ({100 * stats['peak_saturation']:.0f}% at peak), "
+            f"{stats['queued']} waiting, average wait {stats['average_wait_ms']:.1f} ms, "
+            f"max wait {stats['max_wait_ms']:.1f} ms"
+        )
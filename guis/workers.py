@@ -1,8 +1,10 @@
 import sip
 import sys
+import time
+import threading
 import traceback
 from time import sleep
-from PyQt5.QtCore import pyqtSignal, QObject, QRunnable, pyqtSlot, QThreadPool, QMutex
+from PyQt5.QtCore import pyqtSignal, QObject, QRunnable, pyqtSlot, QMutex, Qt
 
 
 # Worker Signals framework from https://www.pythonguis.com/tutorials/multithreading-pyqt-applications-qthreadpool/
@@ -32,12 +34,126 @@ class WorkerSignals(QObject):
     progress = pyqtSignal(int)
 
 
+class frameMailbox(QObject):
+    """
+    Hands preview frames from a worker thread to the GUI thread, keeping only the latest one.
+
+    A worker posts every frame it fetches. If the GUI thread has not taken the previous
+      frame yet, that frame is replaced (and counted as dropped) instead of queueing up
+      behind it in the event loop. The frames are delivered in the GUI thread through the
+      result signal.
+    """
+
+    result = pyqtSignal(object)
+    posted = pyqtSignal()
+
+    def __init__(self):
+        super(frameMailbox, self).__init__()
+        self.mutex = QMutex()
+        self.frame = None
+        self.pending = False  # True while there is a frame that has not been delivered yet
+
+        # statistics
+        self.delivered = 0
+        self.dropped = 0
+
+        # always queued, so frames are delivered from the event loop even if posted from the GUI thread
+        self.posted.connect(self.deliver, Qt.QueuedConnection)
+
+    @property
+    def queue_depth(self):
+        """queue_depth
+        Number of frames waiting to be delivered, either 0 or 1
+        """
+        return int(self.pending)
+
+    def post(self, frame):
+        """post
+        Called from the worker thread with a new frame. Replaces any undelivered frame.
+        """
+        self.mutex.lock()
+        was_pending = self.pending
+        if was_pending:
+            self.dropped += 1
+        self.frame = frame
+        self.pending = True
+        self.mutex.unlock()
+        if not was_pending:
+            self.posted.emit()
+
+    def deliver(self):
+        """deliver
+        Runs in the GUI thread, emits the latest frame
+        """
+        self.mutex.lock()
+        frame = self.frame
+        self.frame = None
+        self.pending = False
+        self.delivered += 1
+        self.mutex.unlock()
+        self.result.emit(frame)
+
+
+class framePacer:
+    """
+    Works out how long a preview loop should wait before fetching the next frame.
+
+    Aims for target_fps frames per second, taking into account how long fetching the
+      last frame took (smoothed with an exponential moving average). If the GUI has not
+      drawn the last frame yet, the loop waits an extra frame period, so it does not fetch
+      frames that will only be dropped.
+
+    rate_scale can be lowered to run below the target, ie 0.2 for a fifth of the frame rate.
+    """
+
+    def __init__(self, target_fps, min_delay=0.005, smoothing=0.2):
+        self.target_period = 1.0 / target_fps
+        self.rate_scale = 1.0
+        self.min_delay = min_delay
+        self.smoothing = smoothing
+        self.fetch_time = None  # moving average of the time it takes to fetch a frame
+
+    def nextDelay(self, fetch_time, backlog=False):
+        """nextDelay
+        Args:
+            fetch_time (float): seconds it took to fetch the last frame
+            backlog (bool, optional): True if the last frame has not been drawn yet. Defaults to False.
+
+        Returns:
+            delay (float): seconds to wait before fetching the next frame
+        """
+        if self.fetch_time is None:
+            self.fetch_time = fetch_time
+        else:
+            self.fetch_time += self.smoothing * (fetch_time - self.fetch_time)
+
+        delay = self.period - self.fetch_time
+        if backlog:
+            delay += self.period
+        return max(self.min_delay, delay)
+
+    @property
+    def period(self):
+        """period
+        Seconds between frames at the current rate
+        """
+        return self.target_period / self.rate_scale
+
+
 class previewWorker(QRunnable):
     """
     Worker thread
+
+    If target_fps is given the worker runs in paced mode: frames are posted to
+      self.mailbox (connect to mailbox.result) instead of signals.result, and the time
+      between frames is set by a framePacer.
+
+    The worker can be paused with setPaused, it then waits without fetching frames
+      until it is resumed or closed.
+      on_exit, if given, is called with the worker, in the worker thread, once the worker has stopped.
     """
 
-    def __init__(self, gui):
+    def __init__(self, gui, target_fps=None, on_exit=None):
         super(previewWorker, self).__init__()
         self.gui = gui
         # Store constructor arguments (re-used for processing)
@@ -45,6 +161,29 @@ class previewWorker(QRunnable):
         self.still_running = True  # used to stop the worker when the window is closed
         self.mutex = QMutex()
 
+        self.pacer = None if target_fps is None else framePacer(target_fps)
+        self.mailbox = frameMailbox()
+
+        self.resume = threading.Event()  # cleared while the worker is paused
+        self.resume.set()
+        self.on_exit = on_exit
+
+    def setPaused(self, paused):
+        """setPaused
+        Pause or resume fetching frames. Resuming takes effect immediately.
+        """
+        if paused:
+            self.resume.clear()
+        else:
+            self.resume.set()
+
+    def setRateScale(self, rate_scale):
+        """setRateScale
+        Run at a fraction of the target frame rate, ie 0.2 for a fifth. Only used in paced mode.
+        """
+        if self.pacer is not None:
+            self.pacer.rate_scale = rate_scale
+
     def close(self):
         """close
         Stop the worker when the preview window is closed
@@ -52,6 +191,7 @@ class previewWorker(QRunnable):
         self.mutex.lock()
         self.still_running = False  # ends the loops/worker above
         self.mutex.unlock()
+        self.resume.set()  # wake the worker up if it is paused, so it can exit
         self.signals.finished.emit()
 
     @pyqtSlot()
@@ -60,8 +200,13 @@ class previewWorker(QRunnable):
         Initialise the runner function.
         """
         
+        delay = 0.05
         while self.still_running:
-            sleep(0.05)
+            if not self.resume.is_set():
+                self.resume.wait()
+                continue
+            sleep(delay)
+            start = time.monotonic()
             try:
                 result = self.gui.getPreview()
             except:
@@ -69,5 +214,15 @@ class previewWorker(QRunnable):
                 exctype, value = sys.exc_info()[:2]
                 self.signals.error.emit((exctype, value, traceback.format_exc()))
             else:
-                if not sip.isdeleted(self.signals):
-                    self.signals.result.emit(result)  # Return the result of the processing
+                if self.pacer is None:
+                    if not sip.isdeleted(self.signals):
+                        self.signals.result.emit(result)  # Return the result of the processing
+                elif not sip.isdeleted(self.mailbox):
+                    self.mailbox.post(result)
+            if self.pacer is not None and not sip.isdeleted(self.mailbox):
+                delay = self.pacer.nextDelay(
+                    time.monotonic() - start, backlog=self.mailbox.pending
+                )
+
+        if self.on_exit is not None:
+            self.on_exit(self)
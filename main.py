@@ -1,7 +1,10 @@
+# imported first, so it knows when the application started
+import startup
+
 import os
 import sys
+from functools import partial
 from PyQt5 import QtGui, QtCore, QtWidgets
-from PyQt5.QtCore import QThreadPool
 
 from utils import init_logger
 from guis.basicGUI import basicGUI
@@ -15,6 +18,8 @@ from guis.piEyedPiperGUI import piEyedPiperGUI
 from guis.progressDialog import progressDialog
 from guis.settings.settings import DEBUG, STORAGE_PATH
 
+startup.mark("Imports done")
+
 class entomoloGUI(basicGUI, QtWidgets.QMainWindow):
     """
     entomoloGUI is a graphical user interface designed for pinned insect imaging
@@ -36,23 +41,22 @@ class entomoloGUI(basicGUI, QtWidgets.QMainWindow):
 
         jcs = JsonCameraSetting()
 
-        # Used to run worker threads in other guis
-        self.threadpool = QThreadPool()
+        # worker threads run in the pools in guis/threadPools.py, one per kind of work
 
         # make a pop up to give users something pretty to look at
         # self.progress = progressDialog()
         # self.progress._open()
 
         # setup the pi-eyes gui
-        self.piEyedPiper = piEyedPiperGUI(threadpool=self.threadpool)
+        self.piEyedPiper = piEyedPiperGUI()
         # self.progress.update(60, "Making Bacon..")
 
         # setup the canons guid
-        self.canons = canonsGUI(threadpool=self.threadpool)
+        self.canons = canonsGUI()
         # self.progress.update(70, "Doing Breakfast Dishes..")
 
         # setup the take photos button
-        self.takePhotos = takePhotosGUI(STORAGE_PATH, threadpool=self.threadpool)
+        self.takePhotos = takePhotosGUI(STORAGE_PATH)
         # self.progress.update(100, "Grabbing Keys..")
 
         # shut down the raspberry pis
@@ -74,6 +78,15 @@ class entomoloGUI(basicGUI, QtWidgets.QMainWindow):
 
         # self.progress._close()
 
+        # the cameras connect in the background, and show "Connecting..." until they are ready
+        self.connecting = set()
+        self.all_ready_logged = False
+        for camera in self.piEyedPiper.getCameras() + self.canons.getCameras():
+            camera.ready.connect(partial(self.cameraReady, camera))
+            if camera.connecting:
+                self.connecting.add(camera)
+        QtCore.QTimer.singleShot(0, self.windowShown)
+
     def initUI(self):
         """initUT
         Sets the layout of the UI
@@ -100,11 +113,44 @@ class entomoloGUI(basicGUI, QtWidgets.QMainWindow):
         topLeftPoint = QtWidgets.QApplication.desktop().availableGeometry().topLeft()
         self.move(topLeftPoint)
 
+    def windowShown(self):
+        """windowShown
+        Runs once the event loop has started, right after the window is first drawn
+        """
+        startup.mark("Window shown")
+        if not self.connecting:
+            self.allCamerasReady()
+
+    def cameraReady(self, camera):
+        """cameraReady
+        Called when a camera has connected, or turned out to be offline
+        """
+        if camera not in self.connecting:
+            return
+        self.connecting.discard(camera)
+        if not self.connecting:
+            self.allCamerasReady()
+
+    def allCamerasReady(self):
+        if self.all_ready_logged:
+            return
+        self.all_ready_logged = True
+        offline = [
+            camera.camera_name
+            for camera in self.piEyedPiper.getCameras() + self.canons.getCameras()
+            if camera.is_offline
+        ]
+        startup.mark("All cameras ready")
+        if offline:
+            self.log.info(f"Offline cameras: {', '.join(offline)}")
+
     def update_settings(self):
         self.piEyedPiper.grid.update()
 
 if __name__ == "__main__":
     init_logger(debug=DEBUG)
+    # the milestones reached while importing were not logged yet
+    startup.logMarks()
 
     QtCore.QCoreApplication.addLibraryPath(
         os.path.join(
@@ -0,0 +1,401 @@
+import time
+import socket
+import logging
+import threading
+import ipaddress
+from urllib.parse import urlsplit, urlunsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from guis.settings.settings import (
+    HTTP_CONNECT_TIMEOUT,
+    HTTP_READ_TIMEOUT,
+    HTTP_POOL_SIZE,
+    HOST_CACHE_TTL,
+    OFFLINE_FAILURE_THRESHOLD,
+    OFFLINE_MIN_BACKOFF,
+    OFFLINE_MAX_BACKOFF,
+    PROBE_TIMEOUT,
+)
+
+
+class hostResolver:
+    """
+    Cache of resolved addresses for the Pi-Eye hostnames.
+
+    The Pi-Eyes are reached through mDNS hostnames like pieye-ant.local, and resolving
+      these can take hundreds of milliseconds. Each hostname is resolved once and the
+      address is reused for all requests. Once the address is older than the ttl it is
+      refreshed in a background thread, while the old address keeps being used. After a
+      connection failure the address is invalidated, so the next request resolves it again.
+    """
+
+    def __init__(self, ttl=HOST_CACHE_TTL):
+        self.log = logging.getLogger("UThread")
+        self.ttl = ttl
+        self.lock = threading.Lock()
+
+        # hostname -> (address, time it was resolved)
+        self.entries = {}
+
+        # hostnames that are currently being refreshed in the background
+        self.refreshing = set()
+
+        # statistics
+        self.hits = 0
+        self.misses = 0
+        self.miss_time = 0.0
+
+    def resolve(self, hostname, block=True):
+        """resolve
+        Get the address of a hostname, from the cache if possible.
+
+        Args:
+            hostname (str): hostname to resolve, ie 'pieye-ant.local'
+            block (bool, optional): If False, return None instead of resolving when the hostname
+              is not cached. Defaults to True.
+
+        Raises:
+            OSError: if the hostname could not be resolved
+
+        Returns:
+            address (str or None): the ip address of the host
+        """
+        if self._isAddress(hostname):
+            return hostname
+
+        with self.lock:
+            entry = self.entries.get(hostname)
+            if entry is not None:
+                self.hits += 1
+        if entry is not None:
+            address, resolved_at = entry
+            if time.monotonic() - resolved_at > self.ttl:
+                self._refreshInBackground(hostname)
+            return address
+
+        if not block:
+            return None
+
+        start = time.monotonic()
+        try:
+            address = self._lookup(hostname)
+        finally:
+            duration = time.monotonic() - start
+            with self.lock:
+                self.misses += 1
+                self.miss_time += duration
+        self.log.debug(f"Resolved {hostname} to {address} in {1000 * duration:.1f} ms")
+        return address
+
+    def invalidate(self, hostname):
+        """invalidate
+        Forget the cached address of a hostname, ie after failing to connect to it
+        """
+        with self.lock:
+            self.entries.pop(hostname, None)
+
+    def stats(self):
+        """stats
+        Returns:
+            stats (dict): number of cache hits and misses, the hit rate, and the
+              average time (in ms) spent resolving a hostname on a miss
+        """
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "average_miss_ms": 1000 * self.miss_time / self.misses
+                if self.misses
+                else 0.0,
+            }
+
+    def logStats(self):
+        stats = self.stats()
+        self.log.info(
+            f"Hostname cache: {stats['hits']} hits, {stats['misses']} misses ({100 * stats['hit_rate']:.0f}% hits), "
+            f"average {stats['average_miss_ms']:.1f} ms resolving a miss"
+        )
+
+    def _lookup(self, hostname):
+        # resolve the hostname and store the result in the cache
+        infos = socket.getaddrinfo(hostname, None, socket.AF_INET, socket.SOCK_STREAM)
+        address = infos[0][4][0]
+        with self.lock:
+            self.entries[hostname] = (address, time.monotonic())
+        return address
+
+    def _refreshInBackground(self, hostname):
+        with self.lock:
+            if hostname in self.refreshing:
+                return
+            self.refreshing.add(hostname)
+
+        def refresh():
+            try:
+                self._lookup(hostname)
+            except OSError as ex:
+                # keep using the old address, it is invalidated if connecting to it fails
+                self.log.debug(f"Could not refresh address of {hostname}: {ex}")
+            finally:
+                with self.lock:
+                    self.refreshing.discard(hostname)
+
+        threading.Thread(target=refresh, name="HostResolver", daemon=True).start()
+
+    @staticmethod
+    def _isAddress(hostname):
+        try:
+            ipaddress.ip_address(hostname)
+            return True
+        except ValueError:
+            return False
+
+
+def url_with_address(url, address):
+    """url_with_address
+    Replace the hostname in a url with its resolved address.
+
+    Args:
+        url (str): url to change, ie 'http://pieye-ant.local:8080/capture'
+        address (str): ip address of the host, ie '169.254.10.2'
+
+    Returns:
+        (str, dict): the url with the address instead of the hostname, and the headers
+          needed so the request still looks like it went to the hostname
+    """
+    parts = urlsplit(url)
+    netloc = address if parts.port is None else f"{address}:{parts.port}"
+    return urlunsplit(parts._replace(netloc=netloc)), {"Host": parts.netloc}
+
+
+class circuitBreaker:
+    """
+    Keeps track of whether a camera is online, so requests to an unplugged camera fail fast.
+
+    After failure_threshold failed requests in a row the camera is marked offline. While
+      offline, requests are not attempted at all. Instead, once the backoff has passed, a
+      single caller gets to re-check the camera with a cheap probe. If the probe fails the
+      backoff doubles (up to max_backoff), if it succeeds the camera is back online.
+    """
+
+    ONLINE = "online"
+    OFFLINE = "offline"
+
+    def __init__(
+        self,
+        name,
+        failure_threshold=OFFLINE_FAILURE_THRESHOLD,
+        min_backoff=OFFLINE_MIN_BACKOFF,
+        max_backoff=OFFLINE_MAX_BACKOFF,
+    ):
+        self.log = logging.getLogger("UThread")
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.lock = threading.Lock()
+
+        self.state = self.ONLINE
+        self.failures = 0  # number of failures in a row
+        self.backoff = min_backoff
+        self.retry_at = 0.0  # time at which the next probe is allowed
+
+    @property
+    def is_offline(self):
+        return self.state == self.OFFLINE
+
+    def claimProbe(self):
+        """claimProbe
+        Check whether an offline camera should be probed now. Only one caller gets True
+        per backoff period, so several threads do not probe the same camera at once.
+
+        Returns:
+            (bool): True if the caller should probe the camera
+        """
+        with self.lock:
+            now = time.monotonic()
+            if self.state != self.OFFLINE or now < self.retry_at:
+                return False
+            # no one else gets to probe until this probe has had time to finish
+            self.retry_at = now + self.backoff
+            return True
+
+    def secondsUntilProbe(self):
+        """secondsUntilProbe
+        Returns:
+            (float): seconds until an offline camera should be probed again, 0 if online
+        """
+        with self.lock:
+            if self.state != self.OFFLINE:
+                return 0.0
+            return max(0.0, self.retry_at - time.monotonic())
+
+    def recordSuccess(self):
+        with self.lock:
+            if self.state == self.OFFLINE:
+                self.log.info(f"{self.name} is back online")
+            self.state = self.ONLINE
+            self.failures = 0
+            self.backoff = self.min_backoff
+
+    def recordFailure(self):
+        with self.lock:
+            self.failures += 1
+            if self.state == self.ONLINE:
+                if self.failures < self.failure_threshold:
+                    return
+                self.log.warning(
+                    f"{self.name} failed {self.failures} times in a row, marking it offline"
+                )
+                self.state = self.OFFLINE
+                self.backoff = self.min_backoff
+            else:
+                self.backoff = min(2 * self.backoff, self.max_backoff)
+            self.retry_at = time.monotonic() + self.backoff
+
+
+def probe_host(hostname, port, timeout=PROBE_TIMEOUT):
+    """probe_host
+    Cheap check of whether a host is reachable: just open (and close) a TCP connection.
+
+    Args:
+        hostname (str): hostname of the camera, ie 'pieye-ant.local'
+        port (int): port of the camera api, ie 8080
+        timeout (float, optional): seconds to wait for the connection. Defaults to PROBE_TIMEOUT.
+
+    Returns:
+        (bool): True if the connection could be opened
+    """
+    resolver = get_host_resolver()
+    try:
+        address = resolver.resolve(hostname)
+        with socket.create_connection((address, port), timeout=timeout):
+            return True
+    except OSError:
+        resolver.invalidate(hostname)
+        return False
+
+
+class httpClient:
+    """
+    Shared http client for talking to the Pi-Eyes.
+
+    Keeps a pool of keep-alive connections per host, so the preview, full preview and
+      capture requests do not have to open a new TCP connection over the USB-ethernet
+      link every time. The connection pools live in a single HTTPAdapter, which is
+      thread-safe and shared between threads. Each thread gets its own requests.Session
+      on top of it, since sessions themselves are not thread-safe.
+
+    Hostnames are resolved through a hostResolver, so mDNS lookups are not repeated
+      for every request.
+    """
+
+    def __init__(
+        self,
+        connect_timeout=HTTP_CONNECT_TIMEOUT,
+        read_timeout=HTTP_READ_TIMEOUT,
+        pool_size=HTTP_POOL_SIZE,
+        resolver=None,
+    ):
+        self.log = logging.getLogger("UThread")
+        self.resolver = resolver if resolver is not None else get_host_resolver()
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+
+        # pool_connections is the number of hosts to keep pools for, pool_maxsize the
+        #   number of connections kept open to each host. Retries are left to the callers.
+        self.adapter = HTTPAdapter(
+            pool_connections=16, pool_maxsize=pool_size, max_retries=0
+        )
+        self.local = threading.local()
+
+    @property
+    def session(self):
+        """session
+        The requests session for the current thread, created on first use.
+        """
+        session = getattr(self.local, "session", None)
+        if session is None:
+            session = requests.Session()
+            session.mount("http://", self.adapter)
+            session.mount("https://", self.adapter)
+            self.local.session = session
+        return session
+
+    def get(self, url, timeout=None, stream=False):
+        """get
+        Send a GET request using a pooled connection.
+
+        Args:
+            url (str): url to request
+            timeout (float or tuple, optional): either a single timeout or a (connect, read) tuple.
+              Defaults to (connect_timeout, read_timeout).
+            stream (bool, optional): if True, the body is not downloaded until it is read, ie
+              with response.iter_content. The response must then be closed by the caller, so the
+              connection goes back into the pool. Defaults to False.
+
+        Returns:
+            response: the requests response
+        """
+        if timeout is None:
+            timeout = (self.connect_timeout, self.read_timeout)
+
+        hostname = urlsplit(url).hostname
+        try:
+            resolved_url, headers = url_with_address(url, self.resolver.resolve(hostname))
+        except OSError as ex:
+            raise requests.exceptions.ConnectionError(
+                f"Could not resolve {hostname}: {ex}"
+            ) from ex
+
+        try:
+            return self.session.get(
+                resolved_url, headers=headers, timeout=timeout, stream=stream
+            )
+        except requests.exceptions.ConnectionError:
+            # the host may have gotten a new address, so resolve it again next time
+            self.resolver.invalidate(hostname)
+            raise
+
+
+_host_resolver = None
+_http_client = None
+_circuit_breakers = {}
+_http_client_lock = threading.Lock()
+
+
+def get_circuit_breaker(hostname):
+    """get_circuit_breaker
+    Returns the circuit breaker for a host, shared by the whole application
+    """
+    with _http_client_lock:
+        if hostname not in _circuit_breakers:
+            _circuit_breakers[hostname] = circuitBreaker(hostname)
+        return _circuit_breakers[hostname]
+
+
+def get_host_resolver():
+    """get_host_resolver
+    Returns the hostname resolver shared by the whole application
+    """
+    global _host_resolver
+    with _http_client_lock:
+        if _host_resolver is None:
+            _host_resolver = hostResolver()
+        return _host_resolver
+
+
+def get_http_client():
+    """get_http_client
+    Returns the http client shared by the whole application
+    """
+    global _http_client
+    resolver = get_host_resolver()
+    with _http_client_lock:
+        if _http_client is None:
+            _http_client = httpClient(resolver=resolver)
+        return _http_client
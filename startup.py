@@ -0,0 +1,121 @@
+"""
+Measures how long the application takes to start.
+
+Imported first by main.py, so STARTED_AT is (almost) the moment the application started.
+  mark logs the first time each startup milestone is reached, ie the window being shown
+  or the first preview frame.
+
+Run on its own, it reports which imports take the longest when main.py is imported
+  (using python -X importtime), and checks them against STARTUP_IMPORT_BUDGET_MS and
+  LAZY_MODULES in settings.py. It exits with an error if they are over budget, so an
+  import added to the startup path is caught before it makes starting slower:
+
+    python startup.py
+"""
+import sys
+import time
+import logging
+
+STARTED_AT = time.monotonic()
+
+# milestone -> seconds after STARTED_AT it was first reached
+_marks = {}
+
+
+def mark(milestone):
+    """mark
+    Log how long after starting a milestone was reached. Only the first time is kept.
+
+    Args:
+        milestone (str): ie 'Window shown'
+
+    Returns:
+        (float): seconds after starting the milestone was first reached
+    """
+    if milestone not in _marks:
+        _marks[milestone] = time.monotonic() - STARTED_AT
+        logging.getLogger("UThread").info(
+            f"Startup: {milestone} {1000 * _marks[milestone]:.0f} ms after starting"
+        )
+    return _marks[milestone]
+
+
+def logMarks():
+    """logMarks
+    Log the milestones reached so far again, ie the ones reached before the logger was set up
+    """
+    log = logging.getLogger("UThread")
+    for milestone, elapsed in _marks.items():
+        log.info(f"Startup: {milestone} {1000 * elapsed:.0f} ms after starting")
+
+
+def import_times(module="main"):
+    """import_times
+    Import a module in a new python process with -X importtime, and collect the time each import took
+
+    Args:
+        module (str, optional): the module to import. Defaults to "main".
+
+    Returns:
+        (list): (module name, self ms, cumulative ms) of every module imported, in the order they finished
+    """
+    import subprocess
+    from pathlib import Path
+
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=Path(__file__).parent,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        # the last lines are the traceback
+        raise RuntimeError(f"Importing {module} failed:\n" + "\n".join(result.stderr.splitlines()[-5:]))
+
+    times = []
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        times.append((name.strip(), int(self_us) / 1000, int(cumulative_us) / 1000))
+    return times
+
+
+def check_import_budget(times, module="main"):
+    """check_import_budget
+    Check the imports against STARTUP_IMPORT_BUDGET_MS and LAZY_MODULES in settings.py
+
+    Args:
+        times (list): as returned by import_times
+        module (str, optional): the module that was imported. Defaults to "main".
+
+    Returns:
+        (list): a description of each problem found, empty if there are none
+    """
+    from guis.settings.settings import STARTUP_IMPORT_BUDGET_MS, LAZY_MODULES
+
+    problems = []
+    # the cumulative time of the module includes all of its imports
+    total = next(cumulative for name, _, cumulative in times if name == module)
+    if total > STARTUP_IMPORT_BUDGET_MS:
+        problems.append(
+            f"Imports took {total:.0f} ms, the budget is {STARTUP_IMPORT_BUDGET_MS} ms"
+        )
+    imported = {name for name, _, _ in times}
+    for lazy in LAZY_MODULES:
+        if lazy in imported:
+            problems.append(f"{lazy} is imported at startup, it should only be imported where it is used")
+    return problems
+
+
+if __name__ == "__main__":
+    times = import_times()
+    print("Slowest imports (cumulative ms, self ms):")
+    for name, self_ms, cumulative_ms in sorted(times, key=lambda t: -t[2])[:20]:
+        print(f"{cumulative_ms:10.1f} {self_ms:10.1f}  {name}")
+
+    problems = check_import_budget(times)
+    for problem in problems:
+        print("Over budget: " + problem)
+    sys.exit(1 if problems else 0)
@@ -0,0 +1,165 @@
+import threading
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from types import SimpleNamespace
+from unittest import mock
+
+from guis import canonDiscovery as discovery_module
+from guis.cameraActor import cameraActor, cameraHangError
+from guis.canonDiscovery import canonDiscovery
+
+MODEL = "Canon EOS 5DS R"
+
+
+class fakeGphoto2:
+    """
+    Stands in for the gphoto2 module, with a canon body on each port. Keeps the ports every
+      camera was initialized and closed on, so a test can check which bodies were disturbed.
+    """
+
+    GP_OK = 0
+    GPhoto2Error = RuntimeError
+
+    def __init__(self, bodies):
+        # port -> (owner, serial) of the body plugged into it
+        self.bodies = bodies
+        self.inits = []
+        self.exits = []
+        self.lock = threading.Lock()
+
+        owner = self
+
+        class PortInfoList(list):
+            def load(self):
+                self[:] = list(owner.bodies)
+
+            def lookup_path(self, port):
+                return self.index(port) if port in self else -1
+
+        class CameraAbilitiesList(list):
+            def load(self):
+                self[:] = [MODEL]
+
+            def lookup_model(self, model):
+                return self.index(model)
+
+        class Camera:
+            @staticmethod
+            def autodetect():
+                return [(MODEL, port) for port in owner.bodies]
+
+        self.PortInfoList = PortInfoList
+        self.CameraAbilitiesList = CameraAbilitiesList
+        self.Camera = Camera
+
+    def check_result(self, result):
+        return result[1]
+
+    def gp_camera_new(self):
+        camera = SimpleNamespace(port=None)
+        camera.set_port_info = lambda port: setattr(camera, "port", port)
+        camera.set_abilities = lambda abilities: None
+        return self.GP_OK, camera
+
+    def gp_camera_init(self, camera):
+        with self.lock:
+            self.inits.append(camera.port)
+        return self.GP_OK if camera.port in self.bodies else -1
+
+    def gp_camera_exit(self, camera):
+        with self.lock:
+            self.exits.append(camera.port)
+        return self.GP_OK
+
+    def canonConfig(self, camera):
+        owner, serial = self.bodies[camera.port]
+        return {"ownername": owner, "serialnumber": serial}
+
+
+class fakeBody:
+    """
+    A canon, reconnected the way canonGUI.reconnect does it
+    """
+
+    def __init__(self, discovery, location):
+        self.discovery = discovery
+        self.location = location
+        self.actor = cameraActor(location, {"preview": 0.1})
+        self.controller, self.port = None, None
+        self.reconnect()
+
+    def reconnect(self):
+        if self.port is not None:
+            self.discovery.release(self.port)
+            self.port = None
+        result = self.discovery.getController(self.location)
+        if result is not None:
+            self.controller, _, self.port = result
+        return result is not None
+
+    def preview(self):
+        return self.controller.port
+
+
+class canonReconnectTest(unittest.TestCase):
+    def setUp(self):
+        self.gp = fakeGphoto2({"usb:001": ("Top", "1111"), "usb:002": ("Side", "2222")})
+        self.directory = TemporaryDirectory()
+        patches = [
+            mock.patch.object(discovery_module, "gp", self.gp),
+            mock.patch.object(discovery_module, "canonConfig", self.gp.canonConfig),
+            mock.patch.object(discovery_module.time, "sleep", lambda seconds: None),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.addCleanup(self.directory.cleanup)
+
+        self.discovery = canonDiscovery(Path(self.directory.name) / "ports.json", model=MODEL)
+        self.top = fakeBody(self.discovery, "Top")
+        self.side = fakeBody(self.discovery, "Side")
+        self.assertEqual((self.top.port, self.side.port), ("usb:001", "usb:002"))
+        self.gp.inits.clear()
+
+    def test_reconnect_on_cached_port(self):
+        self.assertTrue(self.top.actor.recover(self.top.reconnect).result(timeout=5))
+        self.assertEqual(self.top.port, "usb:001")
+        self.assertEqual(self.gp.inits, ["usb:001"])
+
+    def test_scan_skips_live_body(self):
+        # the top body was plugged into another port, so it is not on its cached port any more
+        self.gp.bodies = {"usb:003": ("Top", "1111"), "usb:002": ("Side", "2222")}
+        self.assertTrue(self.top.actor.recover(self.top.reconnect).result(timeout=5))
+        self.assertEqual(self.top.port, "usb:003")
+        self.assertNotIn("usb:002", self.gp.inits)
+        self.assertNotIn("usb:002", self.gp.exits)
+        self.assertEqual(self.side.actor.submit(cameraActor.PREVIEW, self.side.preview).result(timeout=5), "usb:002")
+
+    def test_hung_body_reconnects_while_other_stays_live(self):
+        stuck = threading.Event()
+        self.addCleanup(stuck.set)
+        hung = self.top.actor.submit(cameraActor.PREVIEW, stuck.wait)
+        waiting = self.top.actor.submit(cameraActor.PREVIEW, self.top.preview)
+        while self.top.actor.checkHung() is None:
+            stuck.wait(0.02)
+
+        # nothing else runs with the old connection, only the reconnect
+        self.assertIsInstance(hung.exception(timeout=5), cameraHangError)
+        self.assertIsInstance(waiting.exception(timeout=5), cameraHangError)
+        self.assertIsInstance(
+            self.top.actor.submit(cameraActor.PREVIEW, self.top.preview).exception(timeout=5), cameraHangError
+        )
+
+        reconnect = self.top.actor.recover(self.top.reconnect)
+        live = [self.side.actor.submit(cameraActor.PREVIEW, self.side.preview) for _ in range(10)]
+        self.assertTrue(reconnect.result(timeout=5))
+        self.assertEqual([future.result(timeout=5) for future in live], ["usb:002"] * 10)
+        self.assertNotIn("usb:002", self.gp.inits)
+
+        # the top body runs commands again
+        self.assertEqual(self.top.actor.submit(cameraActor.PREVIEW, self.top.preview).result(timeout=5), "usb:001")
+
+
+if __name__ == "__main__":
+    unittest.main()
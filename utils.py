@@ -2,9 +2,12 @@ import logging
 import requests
 import numpy as np
 
-from PIL import Image
+from PIL import Image, ImageDraw
 from logging import handlers
 from PIL.ImageQt import ImageQt
+from urllib.parse import urlsplit
+
+from network import get_http_client, get_circuit_breaker, probe_host
 
 
 def init_logger(debug):
@@ -41,37 +44,64 @@ def init_logger(debug):
     return logger
 
 
-def try_url(url):
+def try_url(url, timeout=None, stream=False):
     """Try Url
     Attempts to get a response from a url. Returns response if successful, None if failed.
+    Requests go through the shared http client, so connections to each host are kept alive and reused.
+    Hosts that failed several times in a row are marked offline, requests to them return None
+    straight away, and they are only re-checked with a quick probe every now and then.
 
     Args:
-        url (_type_): _description_
+        url (str): url to request
+        timeout (float or tuple, optional): single timeout or (connect, read) tuple in seconds.
+            Defaults to the timeouts in settings.py
+        stream (bool, optional): If True, the body is downloaded as it is read, and the caller has
+            to close the response. Defaults to False.
 
     Returns:
         (response or None): returns response if successful, None if failed
     """
     log = logging.getLogger("UThread")
+
+    parts = urlsplit(url)
+    breaker = get_circuit_breaker(parts.hostname)
+    if breaker.is_offline:
+        # do not wait for the timeout on a host known to be offline
+        if not breaker.claimProbe():
+            return None
+        if not probe_host(parts.hostname, parts.port or 80):
+            breaker.recordFailure()
+            return None
+        breaker.recordSuccess()
+
     try:
-        response = requests.get(url, timeout=10)
-        response.raise_for_status()
+        response = get_http_client().get(url, timeout=timeout, stream=stream)
+        # the host answered, so it is online, even if the response is an error
+        breaker.recordSuccess()
+        try:
+            response.raise_for_status()
+        except requests.exceptions.HTTPError:
+            response.close()
+            raise
         return response
-    except requests.exceptions.RequestException as err:
-        log.debug(
-            f'RequestException encountered connecting to url: "{url}", Exception raised: "{err}"'
-        )
     except requests.exceptions.HTTPError as errh:
         log.debug(
             f'HTTPError encountered connecting to url: "{url}", Exception raised: "{errh}"'
         )
     except requests.exceptions.ConnectionError as errc:
+        breaker.recordFailure()
         log.debug(
             f'ConnectionError encountered connecting to url: "{url}", Exception raised: "{errc}"'
         )
     except requests.exceptions.Timeout as errt:
+        breaker.recordFailure()
         log.debug(
             f'Timeout encountered connecting to url: "{url}", Exception raised: "{errt}"'
         )
+    except requests.exceptions.RequestException as err:
+        log.debug(
+            f'RequestException encountered connecting to url: "{url}", Exception raised: "{err}"'
+        )
     except Exception as e:
         log.debug(f'Error connecting to url: "{url}", Exception raised: "{e}"')
     return None
@@ -106,3 +136,24 @@ def make_x_image(width, height):
     # reduce the size of the image to the requested width and height
     big_x = big_x[start_row:end_row, start_col:end_col]
     return ImageQt(Image.fromarray(big_x))
+
+
+def make_text_image(width, height, text):
+    """Make Text Image
+    Returns an image of size (width, height) with the text in white in the center
+    This is a placeholder image for while the camera is being connected to
+
+    Args:
+        width (int): width of the image to be returned
+        height (int): height of the image to be returned
+        text (str): text to write on the image
+
+    Returns:
+        (ImageQt): ImageQt format image of the text
+    """
+    image = Image.new("RGB", (width, height))
+    draw = ImageDraw.Draw(image)
+    left, top, right, bottom = draw.textbbox((0, 0), text)
+    position = ((width - (right - left)) // 2, (height - (bottom - top)) // 2)
+    draw.text(position, text, fill=(255, 255, 255))
+    return ImageQt(image)